@@ -4,11 +4,11 @@ import sys
 import os
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib
 
 sys.path.append(os.path.join(os.getcwd(), 'touchy'))
 try:
-    from t_lib import preferences
+    from t_lib import pref_bus
     HAS_PREFS = True
 except ImportError:
     HAS_PREFS = False
@@ -19,6 +19,7 @@ class HandlerClass:
         self.builder = builder
         self.halcomp = halcomp
     
+        self.bus = None
         self.gremlin = self.builder.get_object("hal_gremlin1")
         if not self.gremlin:
             print(">>> ERROR: 'hal_gremlin1' not found in UI file")
@@ -44,18 +45,8 @@ class HandlerClass:
     def sync_theme_with_touchy(self):
         if not HAS_PREFS:
             return
-
-        prefs = preferences.preferences()
-        theme_name = prefs.getpref('gtk_theme', 'Follow System Theme', str)
-
-        if theme_name == "Follow System Theme":
-            return
-
-        settings = Gtk.Settings.get_default()
-        try:
-            settings.set_property("gtk-theme-name", theme_name)
-        except Exception as e:
-            print(f">>> ERROR setting theme: {e}")
+        # follows touchy's theme and fonts from then on
+        self.bus = pref_bus.gtk_follower(Gtk, GLib)
 
 
 def get_handlers(halcomp, builder, useropts):
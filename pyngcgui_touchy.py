@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+# gladevcp handler for the pyngcgui tab: follows touchy's theme and
+# control font over touchy's preference bus
+
+import sys
+import os
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GLib
+
+sys.path.append(os.path.join(os.getcwd(), 'touchy'))
+try:
+    from t_lib import pref_bus
+    HAS_PREFS = True
+except ImportError:
+    HAS_PREFS = False
+    print(">>> WARNING: Could not import preferences from ./touchy/t_lib/")
+
+class HandlerClass:
+    def __init__(self, halcomp, builder, useropts):
+        self.builder = builder
+        self.halcomp = halcomp
+        self.bus = None
+        if HAS_PREFS:
+            self.bus = pref_bus.gtk_follower(Gtk, GLib)
+
+
+def get_handlers(halcomp, builder, useropts):
+    return [HandlerClass(halcomp, builder, useropts)]
@@ -0,0 +1,354 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# Pre-analysis of a loaded program: extents, rapid and feed length, tools,
+# spindle modes and a rough cycle time.  It runs in a worker process so a
+# long program never holds up the gui; the gui polls for the result.
+#
+# This is a plain scan of the words on each line, not the interpreter.
+# Subroutine calls, canned cycles, threading and parameter expressions are
+# not followed; a summary that skipped any of them is marked partial and
+# its cycle time is a lower bound.
+
+import atexit
+import concurrent.futures
+import concurrent.futures.process
+import math
+import multiprocessing
+
+from t_lib import modal
+
+# the thumbnail of the tool path keeps between this many and twice as many
+# move end points
+THUMBNAIL = 64
+
+# A single worker process.  The gui runs several threads by the time one is
+# needed, which fork does not copy safely, so it is started from a fork
+# server.  A worker that died (out of memory, killed) breaks its pool for
+# good; callers drop the pool and start a new one.
+def worker_pool():
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context('forkserver'))
+
+BrokenPool = concurrent.futures.process.BrokenProcessPool
+
+# machine limits the estimate needs, read once in the gui process; the
+# worker gets a plain dict since linuxcnc.ini does not pickle
+def machine_limits(ini):
+    def get(section, key, default):
+        try:
+            return float(ini.find(section, key) or default)
+        except ValueError:
+            return default
+
+    units = ini.find("TRAJ", "LINEAR_UNITS") or ini.find("AXIS_X", "UNITS")
+    traj = get("TRAJ", "MAX_LINEAR_VELOCITY", 0) or get("TRAJ", "MAX_VELOCITY", 1e99)
+    return {
+        'mm': units in ("mm", "metric", "1.0"),
+        'x_vel': get("AXIS_X", "MAX_VELOCITY", 1e99),
+        'x_acc': get("AXIS_X", "MAX_ACCELERATION", 1e99),
+        'z_vel': get("AXIS_Z", "MAX_VELOCITY", 1e99),
+        'z_acc': get("AXIS_Z", "MAX_ACCELERATION", 1e99),
+        'traj_vel': traj,
+        'max_rpm': get("DISPLAY", "SPINDLE_MAX_SPEED", 0),
+        'startup': ini.find("RS274NGC", "RS274NGC_STARTUP_CODE") or "",
+    }
+
+class summary:
+    def __init__(self, fn):
+        self.fn = fn
+        self.lines = 0
+        # radius and z extents in machine units, None until something moves
+        self.x = None
+        self.z = None
+        self.rapid = 0.0
+        self.feed = 0.0
+        self.tools = []
+        self.spindle_modes = []
+        self.seconds = 0.0
+        self.partial = 0
+        self.error = None
+        # modal state every modal.CHECKPOINT lines, for run from line
+        self.checkpoints = []
+        # (radius, z) points along the tool path, evenly spaced by move
+        self.thumbnail = []
+
+def move_time(d, v, a):
+    # time for a single axis to travel d from rest to rest
+    if d <= 0:
+        return 0.0
+    if d >= v * v / a:
+        return d / v + v / a
+    return 2.0 * math.sqrt(d / a)
+
+def arc_length(x0, z0, x1, z1, cx, cz, ccw):
+    # G18 plane; counter-clockwise is positive from z towards x
+    r = math.hypot(x0 - cx, z0 - cz)
+    a0 = math.atan2(x0 - cx, z0 - cz)
+    a1 = math.atan2(x1 - cx, z1 - cz)
+    if ccw:
+        sweep = (a1 - a0) % (2 * math.pi)
+    else:
+        sweep = (a0 - a1) % (2 * math.pi)
+    if sweep == 0:
+        sweep = 2 * math.pi
+    return r * sweep
+
+def arc_center(x0, z0, x1, z1, r, ccw):
+    # R format: the shorter arc for positive R, the longer one for negative
+    dx = x1 - x0
+    dz = z1 - z0
+    chord = math.hypot(dx, dz)
+    if chord == 0 or abs(r) < chord / 2:
+        return None
+    h = math.sqrt(r * r - chord * chord / 4)
+    if (r < 0) == ccw:
+        h = -h
+    return (x0 + dx / 2 + h * dz / chord, z0 + dz / 2 - h * dx / chord)
+
+def analyze(fn, limits):
+    result = summary(fn)
+    mm = limits['mm']
+    state = modal.modal_state(mm, limits['startup'])
+    x = z = 0.0
+    motion = 0
+    tools = set()
+    modes = set()
+    xmin = zmin = 1e99
+    xmax = zmax = -1e99
+    moved = 0
+    # every stride-th move goes into the thumbnail; the stride doubles
+    # whenever the thumbnail fills up, so long programs cost no more
+    points = [(x, z)]
+    stride = 1
+
+    try:
+        f = open(fn, 'r', errors='replace')
+    except (IOError, OSError) as detail:
+        result.error = str(detail)
+        return result
+
+    with f:
+        for line in f:
+            if result.lines % modal.CHECKPOINT == 0:
+                result.checkpoints.append(state.checkpoint())
+            result.lines += 1
+            p = modal.parse(line)
+            if p is None:
+                continue
+            gcodes, mcodes, v, exact = p
+            state.update(gcodes, mcodes, v)
+            if not exact:
+                # subroutines and parameters need the interpreter
+                result.partial = 1
+                continue
+
+            if 'T' in v:
+                tools.add(int(v['T']))
+
+            dwell = 0
+            skip = 0
+            for g in gcodes:
+                if g in (0, 1, 2, 3):
+                    motion = int(g)
+                elif g == 4:
+                    dwell = 1
+                elif g in (93, 94, 95, 96, 97):
+                    modes.add("G%d" % g)
+                elif g in (28, 30, 33, 33.1, 70, 71, 72, 76) or 81 <= g < 90:
+                    # homing, threading and canned cycles are not followed
+                    result.partial = 1
+                    skip = 1
+
+            if dwell:
+                result.seconds += v.get('P', 0.0)
+                continue
+            if skip or ('X' not in v and 'Z' not in v):
+                continue
+
+            # program units to machine units
+            metric = state.units == 21
+            if metric == mm:
+                scale = 1.0
+            elif mm:
+                scale = 25.4
+            else:
+                scale = 1 / 25.4
+            absolute = state.distance == 90
+            feed = state.feed
+
+            nx = x
+            nz = z
+            if 'X' in v:
+                d = v['X'] * scale
+                if state.diameter == 7:
+                    d /= 2
+                nx = d if absolute else x + d
+            if 'Z' in v:
+                d = v['Z'] * scale
+                nz = d if absolute else z + d
+
+            dx = abs(nx - x)
+            dz = abs(nz - z)
+            if motion == 0:
+                length = math.hypot(dx, dz)
+                result.rapid += length
+                t = max(move_time(dx, limits['x_vel'], limits['x_acc']),
+                        move_time(dz, limits['z_vel'], limits['z_acc']))
+                result.seconds += max(t, length / limits['traj_vel'])
+            else:
+                if motion == 1:
+                    length = math.hypot(dx, dz)
+                else:
+                    ccw = motion == 3
+                    if 'R' in v:
+                        c = arc_center(x, z, nx, nz, v['R'] * scale, ccw)
+                    else:
+                        c = (x + v.get('I', 0.0) * scale, z + v.get('K', 0.0) * scale)
+                    if c is None:
+                        length = math.hypot(dx, dz)
+                    else:
+                        length = arc_length(x, z, nx, nz, c[0], c[1], ccw)
+                result.feed += length
+
+                # feed in machine units per second
+                if state.feed_mode == 93:
+                    rate = length * feed / 60 if feed else 0
+                elif state.feed_mode == 95:
+                    rpm = state.speed
+                    if state.spindle_mode == 96:
+                        # surface speed is m/min or ft/min, by program units
+                        r = abs(nx) / scale
+                        if metric:
+                            r /= 1000
+                        else:
+                            r /= 12
+                        rpm = state.speed / (2 * math.pi * r) if r else 1e99
+                        max_rpm = state.clamp or limits['max_rpm']
+                        if max_rpm:
+                            rpm = min(rpm, max_rpm)
+                    rate = feed * scale * rpm / 60
+                else:
+                    rate = feed * scale / 60
+                rate = min(rate, limits['traj_vel'])
+                if rate > 0:
+                    result.seconds += length / rate
+                else:
+                    result.partial = 1
+
+            x = nx
+            z = nz
+            moved += 1
+            if moved % stride == 0:
+                points.append((x, z))
+                if len(points) >= 2 * THUMBNAIL:
+                    points = points[::2]
+                    stride *= 2
+            xmin = min(xmin, x)
+            xmax = max(xmax, x)
+            zmin = min(zmin, z)
+            zmax = max(zmax, z)
+
+    if moved:
+        result.x = (xmin, xmax)
+        result.z = (zmin, zmax)
+        if points[-1] != (x, z):
+            points.append((x, z))
+        result.thumbnail = points
+    result.tools = sorted(tools)
+    result.spindle_modes = sorted(modes)
+    return result
+
+# Runs analyze() for the file the gui has open.  Only the newest request
+# counts: a result for a file that has since been replaced is dropped.
+class program_analysis:
+    def __init__(self, limits, cache):
+        self.limits = limits
+        # program_cache; a program seen recently is not analysed again
+        self.cache = cache
+        self.executor = None
+        self.registered = 0
+        self.future = None
+        self.fn = None
+        self.key = None
+        self.result = None
+        # bumped whenever result changes, for the status dispatcher
+        self.version = 0
+
+    def submit(self, fn):
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+        self.fn = fn
+        self.key, self.result = self.cache.analysis(fn)
+        self.version += 1
+        if self.result is not None:
+            return
+        try:
+            self.future = self.pool().submit(analyze, fn, self.limits)
+        except BrokenPool:
+            self.shutdown()
+            self.future = self.pool().submit(analyze, fn, self.limits)
+
+    def pool(self):
+        if self.executor is None:
+            if not self.registered:
+                atexit.register(self.shutdown)
+                self.registered = 1
+            self.executor = worker_pool()
+        return self.executor
+
+    def poll(self):
+        f = self.future
+        if f is None:
+            return None
+        if not f.done():
+            # the same content may have been analysed under another name;
+            # known once the listing's index thread has hashed the file
+            r = self.key is not None and self.cache.twin_analysis(self.key)
+            if not r:
+                return None
+            f.cancel()
+            self.future = None
+            self.result = r
+            self.version += 1
+            return r
+        self.future = None
+        if f.cancelled():
+            return None
+        try:
+            result = f.result()
+        except Exception as detail:
+            if isinstance(detail, BrokenPool):
+                self.shutdown()
+            result = summary(self.fn)
+            result.error = str(detail)
+        if result.fn != self.fn:
+            return None
+        if self.key is not None and not result.error:
+            self.cache.put_analysis(self.key, result)
+        self.result = result
+        self.version += 1
+        return result
+
+    def state_at(self, program, n):
+        # modal state at line n of the listing's program, None until the
+        # analysis of that very file is in
+        r = self.result
+        if r is None or r.error or r.fn != getattr(program, 'fn', None):
+            return None
+        return modal.state_at(program, r.checkpoints, n)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
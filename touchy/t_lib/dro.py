@@ -0,0 +1,162 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import math
+
+# Combined work offset (g5x + tool + g92, with the xy rotation folded in).
+# It is rebuilt only when one of the offsets changes; in between, the
+# relative position is one pass over the position vector.
+#
+#   rel = R(p - g5x - tool) - g92 = R p - (R (g5x + tool) + g92)
+class work_offset:
+    def __init__(self):
+        self.key = None
+        self.rotated = 0
+        self.cos = 1.0
+        self.sin = 0.0
+        # g5x + tool + g92 without rotation, the value the hal pins want
+        self.summ = (0.0,) * 9
+        # offset to subtract from the rotated machine position
+        self.offset = (0.0,) * 9
+
+    def update(self, g5x, tool, g92, rotation):
+        key = (g5x, tool, g92, rotation)
+        if key == self.key:
+            return False
+        self.key = key
+
+        base = [a + b for a, b in zip(g5x, tool)]
+        self.summ = tuple([a + b for a, b in zip(base, g92)])
+        offset = list(self.summ)
+
+        self.rotated = rotation != 0
+        if self.rotated:
+            t = math.radians(-rotation)
+            self.cos = math.cos(t)
+            self.sin = math.sin(t)
+            offset[0] = base[0] * self.cos - base[1] * self.sin + g92[0]
+            offset[1] = base[0] * self.sin + base[1] * self.cos + g92[1]
+        self.offset = tuple(offset)
+        return True
+
+    def relative(self, p):
+        if self.rotated:
+            p = list(p)
+            x = p[0] * self.cos - p[1] * self.sin
+            p[1] = p[0] * self.sin + p[1] * self.cos
+            p[0] = x
+        return [a - b for a, b in zip(p, self.offset)]
+
+# Renders DRO labels.  Values are quantised to the display resolution and
+# the last key per label is kept, so a value that moved below the last
+# visible digit costs neither a format nor a gtk round trip.
+class dro_formatter:
+    def __init__(self):
+        self.last = {}
+        self.rendered = 0
+        self.skipped = 0
+        self.set_units(0)
+
+    def set_units(self, mm):
+        if mm:
+            self.fmt = "%c:% 10.3f"
+            self.scale = 1000.0
+        else:
+            self.fmt = "%c:% 9.4f"
+            self.scale = 10000.0
+        self.last = {}
+
+    def invalidate(self):
+        self.last = {}
+
+    # the letter of a label never changes, only the value and the homed
+    # prefix are part of the key
+    def show(self, label, letter, value, prefix=""):
+        if not label: return
+        q = round(value * self.scale)
+        key = (q, prefix)
+        if self.last.get(label) == key:
+            self.skipped += 1
+            return
+        self.last[label] = key
+        self.rendered += 1
+        label.set_label(prefix + self.fmt % (letter, q / self.scale))
+
+if __name__ == "__main__":
+    # micro-benchmark of one lathe DRO tick (R and D rows, 6 labels).  The
+    # stand-in labels are plain python, so the timings leave out the cost
+    # of the gtk calls themselves; those are counted separately.
+    import timeit
+
+    gtk_calls = [0]
+    class label:
+        def __init__(self): self.text = ""
+        def get_label(self):
+            gtk_calls[0] += 1
+            return self.text
+        def set_label(self, t):
+            gtk_calls[0] += 1
+            self.text = t
+
+    def set_text(w, t):
+        if not w: return
+        ot = w.get_label()
+        if ot != t: w.set_label(t)
+
+    labels = [label() for i in range(6)]
+    fmt = "%c:% 10.3f"
+    f = dro_formatter()
+    f.set_units(1)
+    state = {'x': 12.3456}
+
+    def naive():
+        x = state['x']
+        set_text(labels[0], fmt % ('R', x))
+        set_text(labels[1], "*" + fmt % ('R', x))
+        set_text(labels[2], fmt % ('R', 0.0))
+        set_text(labels[3], fmt % ('D', x * 2.0))
+        set_text(labels[4], " " + fmt % ('D', x * 2.0))
+        set_text(labels[5], fmt % ('D', 0.0))
+
+    def cached():
+        x = state['x']
+        f.show(labels[0], 'R', x)
+        f.show(labels[1], 'R', x, "*")
+        f.show(labels[2], 'R', 0.0)
+        f.show(labels[3], 'D', x * 2.0)
+        f.show(labels[4], 'D', x * 2.0, " ")
+        f.show(labels[5], 'D', 0.0)
+
+    def moving(fn):
+        def tick():
+            state['x'] += 0.0137
+            fn()
+        return tick
+
+    def jitter(fn):
+        # encoder noise below the last displayed digit
+        def tick():
+            state['x'] = 12.3456 + (0.0001 if state['x'] < 12.3456 else -0.0001)
+            fn()
+        return tick
+
+    n = 20000
+    for name, a, b in (("idle", naive, cached),
+                       ("jitter", jitter(naive), jitter(cached)),
+                       ("moving", moving(naive), moving(cached))):
+        result = []
+        for fn in (a, b):
+            gtk_calls[0] = 0
+            t = min(timeit.repeat(fn, number=n, repeat=3)) / n * 1e6
+            result += [t, gtk_calls[0] / (3.0 * n)]
+        print("%-7s format+set_text %5.2f us %4.1f gtk calls/tick   "
+              "dro_formatter %5.2f us %4.1f gtk calls/tick" % tuple([name] + result))
@@ -10,15 +10,26 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
-import math
 import os
-
+import time
+
+from t_lib import status_hub
+from t_lib import dro
+from t_lib import render_cache
+from t_lib import error_log
+from t_lib import modal
+from t_lib.scheduler import SAFETY, COSMETIC
 from __main__ import set_active, set_text
 
 class emc_control:
-        def __init__(self, emc, listing, error):
+        def __init__(self, emc, hub, listing, analysis, error):
                 self.emc = emc
-                self.emcstat = emc.stat()
+                self.hub = hub
+                self.analysis = analysis
+                # run the modal state of the start line as mdi before a
+                # run from line; preference, off by default
+                self.resume_preamble = 0
+                self.pending_start = None
                 self.emccommand = emc.command()
                 self.masked = 0
                 self.sb = 0
@@ -30,8 +41,7 @@ class emc_control:
                 self.isjogging = [0,0,0,0,0,0,0,0,0]
                 self.emccommand.teleop_enable(1)
                 self.emccommand.wait_complete()
-                self.emcstat.poll()
-                if self.emcstat.kinematics_type != emc.KINEMATICS_IDENTITY:
+                if self.hub.poll().kinematics_type != emc.KINEMATICS_IDENTITY:
                     raise SystemExit("\n*** emc_control: Only KINEMATICS_IDENTITY is supported\n")
 
         def mask(self):
@@ -45,8 +55,7 @@ class emc_control:
                 self.masked = 0
 
         def is_mode_manual(self):
-                self.emcstat.poll()
-                return self.emcstat.task_state == self.emc.MODE_MANUAL
+                return self.hub.fresh().task_state == self.emc.MODE_MANUAL
 
         def mist_on(self, b):
                 if self.masked: return
@@ -154,8 +163,7 @@ class emc_control:
                 self.emccommand.spindle(self.emc.SPINDLE_DECREASE)
 
         def set_motion_mode(self):
-            self.emcstat.poll()
-            if self.emcstat.motion_mode != self.emc.TRAJ_MODE_TELEOP:
+            if self.hub.fresh().motion_mode != self.emc.TRAJ_MODE_TELEOP:
                 self.emccommand.teleop_enable(1)
                 self.emccommand.wait_complete()
 
@@ -199,7 +207,8 @@ class emc_control:
 
         def reload_tooltable(self, b):
                 if self.masked: return
-                self.emccommand.load_tool_table()                
+                self.emccommand.load_tool_table()
+                self.hub.reload_tool_table()
 
         def opstop_on(self, b):
                 if self.masked: return
@@ -218,13 +227,14 @@ class emc_control:
                 self.emccommand.set_block_delete(0)
 
         def abort(self):
+                self.pending_start = None
                 self.emccommand.abort()
                 set_text(self.error, "")
 
         def single_block(self, s):
                 self.sb = s
-                self.emcstat.poll()
-                if self.emcstat.queue > 0 or self.emcstat.paused:
+                emcstat = self.hub.fresh()
+                if emcstat.queue > 0 or emcstat.paused:
                         # program or mdi is running
                         if s:
                                 self.emccommand.auto(self.emc.AUTO_PAUSE)
@@ -232,32 +242,76 @@ class emc_control:
                                 self.emccommand.auto(self.emc.AUTO_RESUME)
 
         def cycle_start(self):
-                self.emcstat.poll()
-                if self.emcstat.paused:
+                emcstat = self.hub.fresh()
+                if emcstat.paused:
                         if self.sb:
                                 self.emccommand.auto(self.emc.AUTO_STEP)
                         else:
                                 self.emccommand.auto(self.emc.AUTO_RESUME)
                         return
 
-                if self.emcstat.interp_state == self.emc.INTERP_IDLE:
+                if emcstat.interp_state == self.emc.INTERP_IDLE and self.pending_start is None:
+                        start = self.listing.get_startline()
+                        if self.resume_preamble and start > 1 and not self.sb:
+                                self.start_with_preamble(start, emcstat)
+                                return
                         self.emccommand.mode(self.emc.MODE_AUTO)
                         self.emccommand.wait_complete()
                         if self.sb:
                                 self.emccommand.auto(self.emc.AUTO_STEP)
                         else:
-                                self.emccommand.auto(self.emc.AUTO_RUN, self.listing.get_startline())
+                                self.emccommand.auto(self.emc.AUTO_RUN, start)
                                 self.listing.clear_startline()
 
+        def start_with_preamble(self, start, emcstat):
+                state = self.analysis.state_at(self.listing.program, start - 1)
+                if state is None:
+                        set_text(self.error, _("Modal state of the start line is not known yet"))
+                        return
+                self.emccommand.mode(self.emc.MODE_MDI)
+                self.emccommand.wait_complete()
+                for m in modal.preamble(state, emcstat.tool_in_spindle):
+                        self.emccommand.mdi(m)
+                self.emccommand.wait_complete()
+                # the mdi queue runs on its own; poll_resume starts the
+                # program once it has drained, judged by polls made after
+                # task took the commands
+                self.pending_start = (start, state, time.time())
+
+        def poll_resume(self):
+                if self.pending_start is None:
+                        return
+                s = self.hub.snapshot()
+                if s.task_state != self.emc.STATE_ON:
+                        self.pending_start = None
+                        return
+                start, state, queued = self.pending_start
+                if s.stamp <= queued or s.interp_state != self.emc.INTERP_IDLE or s.queue > 0:
+                        return
+                self.pending_start = None
+                # an mdi line that failed leaves the machine in some other
+                # state; do not resume from there
+                gcodes = set(s.gcodes)
+                if (not set(modal.expected_gcodes(state)) <= gcodes or
+                    state.loaded is not None and s.tool_in_spindle != state.loaded):
+                        set_text(self.error, _("Modal preamble did not complete, not resuming"))
+                        return
+                self.emccommand.mode(self.emc.MODE_AUTO)
+                self.emccommand.wait_complete()
+                self.emccommand.auto(self.emc.AUTO_RUN, start)
+                self.listing.clear_startline()
+
 class emc_status:
-        def __init__(self, gtk, emc, listing, hal, relative, absolute, distance,
+        def __init__(self, gtk, emc, hub, listing, analysis, hal, relative, absolute, distance,
                      dro_table,
                      error,
                      estops, machines, override_limit, status,
                      floods, mists, spindles, prefs, opstop, blockdel, spindle_values):
                 self.gtk = gtk
                 self.emc = emc
+                self.hub = hub
                 self.listing = listing
+                self.analysis = analysis
                 self.hal = hal
                 self.relative = relative
                 self.absolute = absolute
@@ -282,16 +336,35 @@ class emc_status:
                 self.machine_units_mm=0
                 self.unit_convert=[1]*9
                 self.actual = 0
-                self.emcstat = emc.stat()
-                self.emcerror = emc.error_channel()
+                self.offsets = dro.work_offset()
+                self.formatter = dro.dro_formatter()
+                self.tooltable_memo = render_cache.memo(self.render_tooltable)
+                # modal states repeat (G96/G97, M3/M5, G54/G55), keep a few
+                self.offsets_memo = render_cache.memo(self.render_offsets, 8)
+                self.codes_memo = render_cache.memo(self.render_active_codes, 16)
+                self.errors = error_log.error_log()
+                self.emcstat = hub.snapshot()
                 
                 self.is_manual_mode = 0
 
+                self.resync = 0
+                self.resync_period = 1.0
+                self.resync_at = 0
+                self.dispatcher = status_hub.dispatcher()
+                self.subscribe()
+
+        def resync_now(self):
+                # a radio button was clicked; show the machine's state again
+                # on the next tick rather than whatever was clicked
+                self.resync += 1
+
         def dro_inch(self, b):
                 self.mm = 0
+                self.formatter.set_units(0)
 
         def dro_mm(self, b):
                 self.mm = 1
+                self.formatter.set_units(1)
 
         def set_machine_units(self,u,c):
                 self.machine_units_mm = u
@@ -307,12 +380,10 @@ class emc_status:
                 self.actual = 1
 
         def get_current_tool(self):
-                self.emcstat.poll()
-                return self.emcstat.tool_in_spindle
+                return self.hub.fresh().tool_in_spindle
 
         def get_current_system(self):
-                self.emcstat.poll()
-                g = self.emcstat.gcodes
+                g = self.hub.fresh().gcodes
                 for i in g:
                         if i >= 540 and i <= 590:
                                 return i/10 - 53
@@ -320,15 +391,51 @@ class emc_status:
                                 return i - 584
                 return 1
 
-        def periodic(self):
-                self.emcstat.poll()
-                am = self.emcstat.axis_mask
-                lathe = not (self.emcstat.axis_mask & 2)
-                dtg = self.emcstat.dtg
+        def subscribe(self):
+                # radio buttons can be clicked out of sync with the machine,
+                # so their updaters also re-run once a second
+                resync = lambda s: self.resync
+                dro_pos = lambda s: s.actual_position if self.actual else s.position
+
+                d = self.dispatcher
+                d.subscribe(self.update_dro, dro_pos, 'dtg', 'g5x_offset', 'tool_offset',
+                            'g92_offset', 'rotation_xy', 'homed', 'axis_mask',
+                            lambda s: self.mm, priority=SAFETY)
+                d.subscribe(self.update_machine, 'task_state',
+                            lambda s: s.joint[0]['override_limits'], resync, priority=SAFETY)
+                d.subscribe(self.update_file, 'file', lambda s: len(self.listing.program))
+                d.subscribe(self.update_motion, 'current_line', 'motion_id',
+                            'distance_to_go', 'current_vel', 'delay_left')
+                d.subscribe(self.update_coolant, 'flood', 'mist', resync)
+                d.subscribe(self.update_spindle, lambda s: s.spindle[0]['direction'],
+                            lambda s: s.spindle[0]['speed'], resync, priority=SAFETY)
+                d.subscribe(self.update_limits, 'limit', priority=SAFETY)
+                d.subscribe(self.update_tools, 'tool_in_spindle', 'pocket_prepped',
+                            'tool_table_version')
+                d.subscribe(self.update_tooltable, 'tool_table_version', priority=COSMETIC)
+                d.subscribe(self.update_offsets, 'rotation_xy', 'tool_offset', 'g5x_index',
+                            'g5x_offset', 'g92_offset', priority=COSMETIC)
+                d.subscribe(self.update_active_codes, 'gcodes', 'mcodes',
+                            lambda s: s.settings[1:3], priority=COSMETIC)
+                d.subscribe(self.update_prefs, lambda s: self.mm, lambda s: self.actual,
+                            'optional_stop', 'block_delete', resync)
+                d.subscribe(self.update_spindle_values, lambda s: s.spindle[0]['speed'],
+                            lambda s: self.hal.spindle_velocity, lambda s: self.hal.spindle_pos)
+                d.subscribe(self.update_analysis, lambda s: self.analysis.version,
+                            lambda s: self.mm, priority=COSMETIC)
+                d.subscribe(self.update_start_state, lambda s: self.listing.start_line,
+                            lambda s: self.analysis.version, priority=COSMETIC)
+                d.subscribe(self.update_listing, 'motion_id', 'interp_state', 'exec_state',
+                            'current_line', 'motion_line')
+
+        def periodic(self, shed=COSMETIC+1):
+                self.emcstat = self.hub.snapshot()
                 self.is_manual_mode = self.emcstat.task_mode == self.emc.MODE_MANUAL
                 self.is_program_executing = self.emcstat.state == self.emc.RCS_EXEC
 
                 if not self.resized_dro:
+                        am = self.emcstat.axis_mask
+                        lathe = not (am & 2)
                         height = 9
                         for i in range(9):
                                 if i == 1 and lathe:
@@ -341,204 +448,260 @@ class emc_status:
                                         
                         self.dro_table.resize(height, 3)
                         self.resized_dro = 1
-                                        
+
+                # by the clock, the status task slows down when idle
+                now = time.time()
+                if now >= self.resync_at:
+                        self.resync_at = now + self.resync_period
+                        self.resync += 1
+
+                self.dispatcher.dispatch(self.emcstat, shed)
+
+                e = None
+                while True:
+                        m = self.hub.get_error()
+                        if not m: break
+                        e = self.errors.add(*m)
+                if e:
+                        if e.count > 1:
+                                set_text(self.error, "%s (x%d)" % (e.text, e.count))
+                        else:
+                                set_text(self.error, e.text)
+
+        def update_dro(self, s):
+                am = s.axis_mask
+                lathe = not (am & 2)
+                dtg = s.dtg
+
                 if self.actual:
-                        p = self.emcstat.actual_position
+                        p = s.actual_position
                 else:
-                        p = self.emcstat.position
-
-                x = p[0] - self.emcstat.g5x_offset[0] - self.emcstat.tool_offset[0]
-                y = p[1] - self.emcstat.g5x_offset[1] - self.emcstat.tool_offset[1]
-                z = p[2] - self.emcstat.g5x_offset[2] - self.emcstat.tool_offset[2]
-                a = p[3] - self.emcstat.g5x_offset[3] - self.emcstat.tool_offset[3]
-                b = p[4] - self.emcstat.g5x_offset[4] - self.emcstat.tool_offset[4]
-                c = p[5] - self.emcstat.g5x_offset[5] - self.emcstat.tool_offset[5]
-                u = p[6] - self.emcstat.g5x_offset[6] - self.emcstat.tool_offset[6]
-                v = p[7] - self.emcstat.g5x_offset[7] - self.emcstat.tool_offset[7]
-                w = p[8] - self.emcstat.g5x_offset[8] - self.emcstat.tool_offset[8]
-
-                if self.emcstat.rotation_xy != 0:
-                        t = math.radians(-self.emcstat.rotation_xy)
-                        xr = x * math.cos(t) - y * math.sin(t)
-                        yr = x * math.sin(t) + y * math.cos(t)
-                        x = xr
-                        y = yr
-
-                x -= self.emcstat.g92_offset[0] 
-                y -= self.emcstat.g92_offset[1] 
-                z -= self.emcstat.g92_offset[2] 
-                a -= self.emcstat.g92_offset[3] 
-                b -= self.emcstat.g92_offset[4] 
-                c -= self.emcstat.g92_offset[5] 
-                u -= self.emcstat.g92_offset[6] 
-                v -= self.emcstat.g92_offset[7] 
-                w -= self.emcstat.g92_offset[8] 
-
-                relp = [x, y, z, a, b, c, u, v, w]
-
-                self.hal.x_summ_offset = 0 - self.emcstat.g5x_offset[0] - self.emcstat.tool_offset[0] - self.emcstat.g92_offset[0]
+                        p = s.position
+
+                self.offsets.update(s.g5x_offset, s.tool_offset, s.g92_offset, s.rotation_xy)
+                relp = self.offsets.relative(p)
+
+                self.hal.x_summ_offset = -self.offsets.summ[0]
 
                 if self.mm != self.machine_units_mm:
                         p = self.convert_units(p,self.unit_convert)
                         relp = self.convert_units(relp,self.unit_convert)
                         dtg = self.convert_units(dtg,self.unit_convert)
 
-                if self.mm:
-                        fmt = "%c:% 10.3f"
-                else:
-                        fmt = "%c:% 9.4f"
-
+                f = self.formatter
                 d = 0
                 if (am & 1):
                         h = " "
-                        if self.emcstat.homed[0]: h = "*"
+                        if s.homed[0]: h = "*"
                         
                         if lathe:
-                                set_text(self.relative[d], fmt % ('R', relp[0]))
-                                set_text(self.absolute[d], h + fmt % ('R', p[0]))
-                                set_text(self.distance[d], fmt % ('R', dtg[0]))
+                                f.show(self.relative[d], 'R', relp[0])
+                                f.show(self.absolute[d], 'R', p[0], h)
+                                f.show(self.distance[d], 'R', dtg[0])
                                 d += 1
-                                set_text(self.relative[d], fmt % ('D', relp[0] * 2.0))
-                                set_text(self.absolute[d], " " + fmt % ('D', p[0] * 2.0))
-                                set_text(self.distance[d], fmt % ('D', dtg[0] * 2.0))
+                                f.show(self.relative[d], 'D', relp[0] * 2.0)
+                                f.show(self.absolute[d], 'D', p[0] * 2.0, " ")
+                                f.show(self.distance[d], 'D', dtg[0] * 2.0)
                         else:
-                                set_text(self.relative[d], fmt % ('X', relp[0]))
-                                set_text(self.absolute[d], h + fmt % ('X', p[0]))
-                                set_text(self.distance[d], fmt % ('X', dtg[0]))
+                                f.show(self.relative[d], 'X', relp[0])
+                                f.show(self.absolute[d], 'X', p[0], h)
+                                f.show(self.distance[d], 'X', dtg[0])
 
                         d += 1
                         
                 for i in range(1, 9):
                         if am & (1<<i):
                                 letter = 'XYZABCUVW'[i]
-                                h = "*" if self.emcstat.homed[coordinates.index(letter)] else " "
-                                set_text(self.relative[d], fmt % (letter, relp[i]))
-                                set_text(self.absolute[d], h + fmt % (letter, p[i]))
-                                set_text(self.distance[d], fmt % (letter, dtg[i]))
+                                h = "*" if s.homed[coordinates.index(letter)] else " "
+                                f.show(self.relative[d], letter, relp[i])
+                                f.show(self.absolute[d], letter, p[i], h)
+                                f.show(self.distance[d], letter, dtg[i])
                                 d += 1
 
-                estopped = self.emcstat.task_state == self.emc.STATE_ESTOP
+        def update_machine(self, s):
+                estopped = s.task_state == self.emc.STATE_ESTOP
                 set_active(self.estops['estop'], estopped)
                 set_active(self.estops['estop_reset'], not estopped)
 
-                on = self.emcstat.task_state == self.emc.STATE_ON
+                on = s.task_state == self.emc.STATE_ON
                 set_active(self.machines['on'], on)
                 set_active(self.machines['off'], not on)
 
-                ovl = self.emcstat.joint[0]['override_limits']
+                ovl = s.joint[0]['override_limits']
                 set_active(self.override_limit, ovl)
 
-                set_text(self.status['file'], os.path.basename(self.emcstat.file))
+        def update_file(self, s):
+                set_text(self.status['file'], os.path.basename(s.file))
                 set_text(self.status['file_lines'], "%d" % len(self.listing.program))
-                set_text(self.status['line'], "%d" % self.emcstat.current_line)
-                set_text(self.status['id'], "%d" % self.emcstat.motion_id)
-                set_text(self.status['dtg'], "%.4f" % self.emcstat.distance_to_go)
-                set_text(self.status['velocity'], "%.4f" % (self.emcstat.current_vel * 60.0))
-                set_text(self.status['delay'], "%.2f" % self.emcstat.delay_left)
 
-                flood = self.emcstat.flood
+        def update_motion(self, s):
+                set_text(self.status['line'], "%d" % s.current_line)
+                set_text(self.status['id'], "%d" % s.motion_id)
+                set_text(self.status['dtg'], "%.4f" % s.distance_to_go)
+                set_text(self.status['velocity'], "%.4f" % (s.current_vel * 60.0))
+                set_text(self.status['delay'], "%.2f" % s.delay_left)
+
+        def update_coolant(self, s):
+                flood = s.flood
                 set_active(self.floods['on'], flood)
                 set_active(self.floods['off'], not flood)
 
-                mist = self.emcstat.mist
+                mist = s.mist
                 set_active(self.mists['on'], mist)
                 set_active(self.mists['off'], not mist)
 
-                spin = self.emcstat.spindle[0]['direction']
+        def update_spindle(self, s):
+                spin = s.spindle[0]['direction']
                 set_active(self.spindles['forward'], spin == 1)
                 set_active(self.spindles['off'], spin == 0)
                 set_active(self.spindles['reverse'], spin == -1)
 
+                sd = (_("CCW"), _("Stopped"), _("CW"))
+                set_text(self.status['spindledir'], sd[spin+1])
+
+                set_text(self.status['spindlespeed'], "%d" % s.spindle[0]['speed'])
+                set_text(self.status['spindlespeed2'], "%d" % s.spindle[0]['speed'])
+
+        def update_limits(self, s):
                 ol = ""
-                for i in range(len(self.emcstat.limit)):
-                        if self.emcstat.limit[i]:
+                for i in range(len(s.limit)):
+                        if s.limit[i]:
                                 ol += "%c " % "XYZABCUVW"[i]
                 set_text(self.status['onlimit'], ol)
 
-                sd = (_("CCW"), _("Stopped"), _("CW"))
-                set_text(self.status['spindledir'], sd[self.emcstat.spindle[0]['direction']+1])
-
-                set_text(self.status['spindlespeed'], "%d" % self.emcstat.spindle[0]['speed'])
-                set_text(self.status['spindlespeed2'], "%d" % self.emcstat.spindle[0]['speed'])
-                set_text(self.status['loadedtool'], "%d" % self.emcstat.tool_in_spindle)
-                if self.emcstat.pocket_prepped == -1:
+        def update_tools(self, s):
+                set_text(self.status['loadedtool'], "%d" % s.tool_in_spindle)
+                if s.pocket_prepped == -1:
                         set_text(self.status['preppedtool'], _("None"))
                 else:
-                        set_text(self.status['preppedtool'], "%d" % self.emcstat.tool_table[self.emcstat.pocket_prepped].id)
+                        set_text(self.status['preppedtool'], "%d" % s.tool_table[s.pocket_prepped].id)
 
-                tt = ""
-                for p, t in zip(list(range(len(self.emcstat.tool_table))), self.emcstat.tool_table):
-                        if t.id != -1:
-                                tt += "<b>P%02d:</b>T%02d\t" % (p, t.id)
-                                if p == 0: tt += '\n'
+        def update_tooltable(self, s):
+                tt = self.tooltable_memo.get(s.tool_table_version, s.tool_table)
                 set_text(self.status['tooltable'], tt)
-                        
-                
-                set_text(self.status['xyrotation'], "%d" % self.emcstat.rotation_xy)
-                set_text(self.status['tlo'], "%.4f" % self.emcstat.tool_offset[2])
 
-                cs = self.emcstat.g5x_index
+        def render_tooltable(self, tool_table):
+                tt = []
+                for p, t in enumerate(tool_table):
+                        if t.id != -1:
+                                tt.append("<b>P%02d:</b>T%02d\t" % (p, t.id))
+                                if p == 0: tt.append('\n')
+                return "".join(tt)
+
+        def update_offsets(self, s):
+                set_text(self.status['xyrotation'], "%d" % s.rotation_xy)
+                set_text(self.status['tlo'], "%.4f" % s.tool_offset[2])
+
+                cslabel, g5x, g92 = self.offsets_memo.get((s.g5x_index, s.g5x_offset, s.g92_offset),
+                                                          s.g5x_index, s.g5x_offset, s.g92_offset)
+                set_text(self.status['label_g5xoffset'], cslabel)
+                set_text(self.status['g5xoffset'], g5x);
+                set_text(self.status['g92offset'], g92);
+
+        def render_offsets(self, cs, g5x_offset, g92_offset):
                 if cs<7:
                         cslabel = "G5%d" % (cs+3)
                 else:
                         cslabel = "G59.%d" % (cs-6)
-                        
-                set_text(self.status['label_g5xoffset'], '<b>' + cslabel + '</b>' + ' Offset:');
 
                 g5x = ""
                 g92 = ""
-                for i in range(len(self.emcstat.g5x_offset)):
+                for i in range(len(g5x_offset)):
                         letter = "XYZABCUVW"[i]
-                        if self.emcstat.g5x_offset[i] != 0: g5x += "%s%.4f " % (letter, self.emcstat.g5x_offset[i])
-                        if self.emcstat.g92_offset[i] != 0: g92 += "%s%.4f " % (letter, self.emcstat.g92_offset[i])
-                                   
-                set_text(self.status['g5xoffset'], g5x);
-                set_text(self.status['g92offset'], g92);
+                        if g5x_offset[i] != 0: g5x += "%s%.4f " % (letter, g5x_offset[i])
+                        if g92_offset[i] != 0: g92 += "%s%.4f " % (letter, g92_offset[i])
+
+                return '<b>' + cslabel + '</b>' + ' Offset:', g5x, g92
 
+        def update_active_codes(self, s):
+                # only the feed and speed words of settings are shown
+                key = (s.gcodes, s.mcodes, s.settings[1], s.settings[2])
+                set_text(self.status['activecodes'], self.codes_memo.get(key, *key))
+
+        def render_active_codes(self, gcodes, mcodes, feed, speed):
                 active_codes = []
-                for i in self.emcstat.gcodes[1:]:
+                for i in gcodes[1:]:
                         if i == -1: continue
                         if i % 10 == 0:
                                 active_codes.append("G%d" % (i/10))
                         else:
                                 active_codes.append("G%d.%d" % (i/10, i%10))
 
-                for i in self.emcstat.mcodes[1:]:
+                for i in mcodes[1:]:
                         if i == -1: continue
                         active_codes.append("M%d" % i)
 
-                feed_str = "F%.1f" % self.emcstat.settings[1]
+                feed_str = "F%.1f" % feed
                 if feed_str.endswith(".0"): feed_str = feed_str[:-2]
                 active_codes.append(feed_str)
-                active_codes.append("S%.0f" % self.emcstat.settings[2])
+                active_codes.append("S%.0f" % speed)
 
-                set_text(self.status['activecodes'], " ".join(active_codes))
+                return " ".join(active_codes)
 
+        def update_prefs(self, s):
                 set_active(self.prefs['inch'], self.mm == 0)
                 set_active(self.prefs['mm'], self.mm == 1)
                 set_active(self.prefs['actual'], self.actual == 1)
                 set_active(self.prefs['commanded'], self.actual == 0)
 
-                set_active(self.opstop['on'], self.emcstat.optional_stop)
-                set_active(self.opstop['off'], not self.emcstat.optional_stop)
+                set_active(self.opstop['on'], s.optional_stop)
+                set_active(self.opstop['off'], not s.optional_stop)
                 
-                set_active(self.blockdel['on'], self.emcstat.block_delete)
-                set_active(self.blockdel['off'], not self.emcstat.block_delete)
+                set_active(self.blockdel['on'], s.block_delete)
+                set_active(self.blockdel['off'], not s.block_delete)
 
-                set_text(self.spindle_values['sp_commanded'], "Set: %d" % self.emcstat.spindle[0]['speed'])
+        def update_spindle_values(self, s):
+                set_text(self.spindle_values['sp_commanded'], "Set: %d" % s.spindle[0]['speed'])
                 set_text(self.spindle_values['sp_current'], "Current: %d" % self.hal.spindle_velocity)
                 set_text(self.spindle_values['sp_angle'], "Angle: %#06.2f" % self.hal.spindle_pos)
 
-                if self.emcstat.motion_id == 0 and (self.emcstat.interp_state == self.emc.INTERP_PAUSED or self.emcstat.exec_state == self.emc.EXEC_WAITING_FOR_DELAY):
-                        self.listing.highlight_line(self.emcstat.current_line)
-                elif self.emcstat.motion_id == 0:
-                        self.listing.highlight_line(self.emcstat.motion_line)
-                else:
-                        self.listing.highlight_line(self.emcstat.motion_id or self.emcstat.motion_line)
+        def update_analysis(self, s):
+                a = self.analysis.result
+                if a is None:
+                        # still running, or no file loaded
+                        t = self.analysis.fn and "..." or ""
+                        for i in ('extents', 'travel', 'tools', 'spindlemodes', 'cycletime'):
+                                set_text(self.status[i], t)
+                        return
+                if a.error:
+                        for i in ('extents', 'travel', 'tools', 'spindlemodes'):
+                                set_text(self.status[i], "")
+                        set_text(self.status['cycletime'], a.error)
+                        return
 
-                e = self.emcerror.poll()
-                if e:
-                        kind, text = e
-                        set_text(self.error, text.replace("\n", " "))
+                c = 1
+                if self.mm != self.machine_units_mm:
+                        c = self.unit_convert[0]
+                if a.x is None:
+                        set_text(self.status['extents'], _("None"))
+                else:
+                        set_text(self.status['extents'], "D%.3f..%.3f  Z%.3f..%.3f" %
+                                 (a.x[0] * 2 * c, a.x[1] * 2 * c, a.z[0] * c, a.z[1] * c))
+                units = self.mm and "mm" or "in"
+                set_text(self.status['travel'], "%.1f / %.1f %s" % (a.rapid * c, a.feed * c, units))
+                set_text(self.status['tools'], " ".join(["T%d" % t for t in a.tools]) or _("None"))
+                set_text(self.status['spindlemodes'], " ".join(a.spindle_modes))
+                t = int(a.seconds + 0.5)
+                t = "%d:%02d:%02d" % (t // 3600, t // 60 % 60, t % 60)
+                if a.partial:
+                        t = ">= " + t
+                set_text(self.status['cycletime'], t)
+
+        def update_start_state(self, s):
+                n = self.listing.start_line
+                if n <= 0:
+                        set_text(self.status['startstate'], "")
+                        return
+                state = self.analysis.state_at(self.listing.program, n)
+                if state is None:
+                        set_text(self.status['startstate'], "...")
+                else:
+                        set_text(self.status['startstate'], modal.describe(state))
 
-                
+        def update_listing(self, s):
+                if s.motion_id == 0 and (s.interp_state == self.emc.INTERP_PAUSED or s.exec_state == self.emc.EXEC_WAITING_FOR_DELAY):
+                        self.listing.highlight_line(s.current_line)
+                elif s.motion_id == 0:
+                        self.listing.highlight_line(s.motion_line)
+                else:
+                        self.listing.highlight_line(s.motion_id or s.motion_line)
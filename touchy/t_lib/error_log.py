@@ -0,0 +1,53 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+import collections
+
+# Bounded history of operator messages.  A message equal to the previous
+# one only bumps its count and time, so a repeating error cannot push the
+# rest of the history out of the ring.
+class entry:
+    def __init__(self, stamp, kind, text):
+        self.first = stamp
+        self.last = stamp
+        self.kind = kind
+        self.text = text
+        self.count = 1
+
+class error_log:
+    def __init__(self, size=200):
+        self.entries = collections.deque(maxlen=size)
+        # bumped on every change so views know when to redraw
+        self.version = 0
+
+    def add(self, stamp, kind, text):
+        text = text.replace("\n", " ")
+        if self.entries:
+            e = self.entries[-1]
+            if e.kind == kind and e.text == text:
+                e.count += 1
+                e.last = stamp
+                self.version += 1
+                return e
+        e = entry(stamp, kind, text)
+        self.entries.append(e)
+        self.version += 1
+        return e
+
+    def latest(self):
+        if self.entries:
+            return self.entries[-1]
+        return None
+
+    def clear(self):
+        self.entries.clear()
+        self.version += 1
@@ -0,0 +1,460 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# The programs the file chooser offers: the local nc_files directory first,
+# then the top level of every mount under /media/<user>.  Subdirectories
+# are listed before the files, as "name/".  The lists stay sorted and are
+# only patched with what changed since the last update().
+#
+# Below the top level, dir_cache lists one directory at a time when it is
+# browsed, and keeps the listing until the directory's mtime changes, so
+# deep trees never need a recursive walk.
+#
+# The local directory is watched with inotify where the C library has it.
+# Mount points, and everything when inotify is not available, are watched
+# by comparing a stat of the directory; a mount point created just before
+# the device is mounted would otherwise be watched underneath the mount.
+#
+# Anything that touches a mount runs on a small pool of daemon threads: a
+# dead stick can hang a stat for a long time, and the gui must not wait.
+# A mount whose scan takes longer than MOUNT_TIMEOUT is shown as not
+# responding, and is scanned again once that scan finally returns.
+
+import bisect
+import collections
+import ctypes
+import ctypes.util
+import os
+import queue
+import struct
+import threading
+import time
+
+EXTENSIONS = ('.ngc', '.nc', '.tap', '.gcode')
+SEPARATOR = ("--- USB ---", None)
+MOUNT_TIMEOUT = 2.0
+SCAN_THREADS = 3
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT = struct.Struct('iIII')
+
+_libc = None
+
+def libc():
+    global _libc
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            _libc.inotify_init1
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc
+
+def program_names(path):
+    # names of the programs and, with a trailing slash, the directories
+    # directly in path; empty if it cannot be read
+    names = set()
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                if e.name.startswith('.'):
+                    continue
+                if e.is_dir():
+                    names.add(e.name + '/')
+                elif e.name.lower().endswith(EXTENSIONS) and e.is_file():
+                    names.add(e.name)
+    except OSError:
+        pass
+    return names
+
+# changes() returns (added, removed) name sets since the last call; the
+# first call reports everything there is
+class poll_watcher:
+    def __init__(self, path):
+        self.path = path
+        self.names = set()
+        self.stamp = None
+
+    def changed(self):
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        except OSError:
+            stamp = None
+        if stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        return True
+
+    def changes(self):
+        if not self.changed():
+            return set(), set()
+        names = program_names(self.path) if self.stamp else set()
+        added = names - self.names
+        removed = self.names - names
+        self.names = names
+        return added, removed
+
+    def close(self):
+        pass
+
+class inotify_watcher:
+    def __init__(self, path):
+        self.path = path
+        self.names = set()
+        self.wd = -1
+        self.fd = libc().inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+
+    def rescan(self):
+        names = program_names(self.path)
+        added = names - self.names
+        removed = self.names - names
+        self.names = names
+        return added, removed
+
+    def changes(self):
+        if self.wd < 0:
+            # not there yet, or gone; try again
+            self.wd = libc().inotify_add_watch(self.fd, os.fsencode(self.path), WATCH_MASK)
+            if self.wd < 0:
+                removed = self.names
+                self.names = set()
+                return set(), removed
+            self.drain()
+            return self.rescan()
+
+        added = set()
+        removed = set()
+        for mask, name in self.drain():
+            if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # events were lost or the directory itself went away:
+                # start over from what is there now
+                if not mask & IN_Q_OVERFLOW:
+                    self.wd = -1
+                a, r = self.changes() if self.wd < 0 else self.rescan()
+                return (added - r) | a, (removed - a) | r
+            if mask & IN_ISDIR:
+                if name.startswith('.'):
+                    continue
+                name += '/'
+            elif not name.lower().endswith(EXTENSIONS):
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if name not in self.names:
+                    self.names.add(name)
+                    added.add(name)
+                    removed.discard(name)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                if name in self.names:
+                    self.names.discard(name)
+                    removed.add(name)
+                    added.discard(name)
+        return added, removed
+
+    def drain(self):
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            except OSError:
+                return events
+            i = 0
+            while i + EVENT.size <= len(buf):
+                wd, mask, cookie, length = EVENT.unpack_from(buf, i)
+                i += EVENT.size
+                name = os.fsdecode(buf[i:i + length].rstrip(b'\0'))
+                i += length
+                events.append((mask, name))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def watcher(path, inotify=True):
+    if inotify and libc():
+        try:
+            return inotify_watcher(path)
+        except OSError:
+            pass
+    return poll_watcher(path)
+
+def entry(path, name):
+    # (label, path); directories keep their slash in the label only
+    return (name, os.path.join(path, name.rstrip('/')))
+
+class job:
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.started = time.time()
+        self.done = False
+        self.result = None
+
+# threads are daemons, a scan stuck in the kernel must not hold up exit
+class scan_pool:
+    def __init__(self, threads):
+        self.jobs = queue.Queue()
+        for i in range(threads):
+            t = threading.Thread(target=self.run, name="touchy-usb-scan")
+            t.daemon = True
+            t.start()
+
+    def submit(self, fn, *args):
+        j = job(fn, args)
+        self.jobs.put(j)
+        return j
+
+    def run(self):
+        while True:
+            j = self.jobs.get()
+            try:
+                j.result = j.fn(*j.args)
+            except Exception as detail:
+                print("file_index:", detail)
+            j.done = True
+
+class mount:
+    def __init__(self, path):
+        self.path = path
+        self.watch = poll_watcher(path)
+        self.job = None
+        self.stalled = 0
+
+# where each program of a listing is, by path and by file name; rebuilt
+# when the listing changes, so a lookup is a dictionary access
+class positions:
+    def __init__(self, entries):
+        self.paths = {}
+        self.names = {}
+        for i, (name, path) in enumerate(entries):
+            if path is None or name == "..":
+                continue
+            self.paths[path] = i
+            self.names.setdefault(os.path.basename(path), []).append(i)
+
+# local files, then a separator and the usb files if there are any; behaves
+# like the list of (name, path) tuples the file chooser used to build
+class file_index:
+    def __init__(self, local_dir, media_root, inotify=True):
+        self.local_dir = local_dir
+        self.media_root = media_root
+        self.local_dirs = []
+        self.local = []
+        self.usb_dirs = []
+        self.usb = []
+        self.local_watch = watcher(local_dir, inotify)
+        self.media_watch = poll_watcher(media_root)
+        self.mounts = {}
+        self.pool = None
+        # bumped on every change, so views know when to repopulate
+        self.version = 0
+        self.separator = SEPARATOR
+        self.positions = None
+        self.update()
+
+    def apply(self, dirs, files, path, added, removed):
+        for name in removed:
+            f = entry(path, name)
+            l = dirs if name.endswith('/') else files
+            i = bisect.bisect_left(l, f)
+            if i < len(l) and l[i] == f:
+                del l[i]
+        for name in added:
+            bisect.insort(dirs if name.endswith('/') else files, entry(path, name))
+        return len(added) + len(removed)
+
+    def update(self):
+        # apply what changed since the last call; returns the number of
+        # files added or removed
+        n = self.apply(self.local_dirs, self.local, self.local_dir, *self.local_watch.changes())
+
+        # mount points come and go with the devices; media_root has only
+        # a handful of entries, so it is simply listed when it changed.
+        # Whether an entry is a directory is left to the scan, a stat of a
+        # mount point can hang as well
+        if self.media_watch.changed():
+            try:
+                mounts = set(os.path.join(self.media_root, m) for m in os.listdir(self.media_root))
+            except OSError:
+                mounts = set()
+            for m in set(self.mounts) - mounts:
+                del self.mounts[m]
+                before = len(self.usb) + len(self.usb_dirs)
+                self.usb = [f for f in self.usb if os.path.dirname(f[1]) != m]
+                self.usb_dirs = [f for f in self.usb_dirs if os.path.dirname(f[1]) != m]
+                n += before - len(self.usb) - len(self.usb_dirs)
+            for m in mounts - set(self.mounts):
+                self.mounts[m] = mount(m)
+
+        now = time.time()
+        stalled = []
+        for m in self.mounts.values():
+            j = m.job
+            if j is None:
+                if self.pool is None:
+                    self.pool = scan_pool(SCAN_THREADS)
+                m.job = self.pool.submit(m.watch.changes)
+            elif j.done:
+                m.job = None
+                m.stalled = 0
+                if j.result:
+                    n += self.apply(self.usb_dirs, self.usb, m.path, *j.result)
+            elif now - j.started > MOUNT_TIMEOUT:
+                m.stalled = 1
+                stalled.append(os.path.basename(m.path))
+
+        if stalled:
+            separator = ("--- USB (%s not responding) ---" % ", ".join(sorted(stalled)), None)
+        else:
+            separator = SEPARATOR
+        if separator != self.separator:
+            self.separator = separator
+            self.version += 1
+
+        if n:
+            self.version += 1
+        return n
+
+    def roots(self):
+        # directories shown on the top level rather than browsed
+        return [self.local_dir] + list(self.mounts)
+
+    def contains(self, path):
+        return (path.startswith(self.local_dir + os.sep) or
+                path.startswith(self.media_root + os.sep))
+
+    def show_usb(self):
+        return self.usb or self.usb_dirs or self.separator is not SEPARATOR
+
+    def parts(self):
+        if self.show_usb():
+            return (self.local_dirs, self.local, (self.separator,), self.usb_dirs, self.usb)
+        return (self.local_dirs, self.local)
+
+    def __len__(self):
+        return sum(len(l) for l in self.parts())
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        for l in self.parts():
+            if i < len(l):
+                return l[i]
+            i -= len(l)
+        raise IndexError("file index out of range")
+
+    def __iter__(self):
+        for l in self.parts():
+            for f in l:
+                yield f
+
+    def lookup(self):
+        if self.positions is None or self.positions.version != self.version:
+            self.positions = positions(self)
+            self.positions.version = self.version
+        return self.positions
+
+    def find(self, path):
+        return self.lookup().paths.get(path, -1)
+
+    def find_name(self, name):
+        return self.lookup().names.get(name, [])
+
+    def close(self):
+        self.local_watch.close()
+
+# One directory below the top level: ".." first, then the directories and
+# the files, each sorted.
+class dir_view:
+    def __init__(self, path, parent, names):
+        self.path = path
+        self.parent = parent
+        names = sorted(names)
+        self.entries = [("..", parent)]
+        self.entries += [entry(path, n) for n in names if n.endswith('/')]
+        self.entries += [entry(path, n) for n in names if not n.endswith('/')]
+        self.positions = positions(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        return self.entries[i]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def find(self, path):
+        return self.positions.paths.get(path, -1)
+
+    def find_name(self, name):
+        return self.positions.names.get(name, [])
+
+# Listings of browsed directories, reused until the directory's mtime
+# changes.  Directories on removable media are listed on the scan pool;
+# get() returns the last listing it has, or None, until that one is in.
+class dir_cache:
+    def __init__(self, index, size=64):
+        self.index = index
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.jobs = {}
+
+    def get(self, path, parent):
+        if not path.startswith(self.index.media_root + os.sep):
+            view = self.refresh(path, parent)
+        else:
+            j = self.jobs.get(path)
+            if j is None:
+                if self.index.pool is None:
+                    self.index.pool = scan_pool(SCAN_THREADS)
+                self.jobs[path] = self.index.pool.submit(self.refresh, path, parent)
+            elif j.done:
+                del self.jobs[path]
+            e = self.entries.get(path)
+            view = e and e[1]
+        if path in self.entries:
+            self.entries.move_to_end(path)
+            self.trim()
+        return view
+
+    def refresh(self, path, parent):
+        # a stat, plus a listing only when the directory changed
+        try:
+            st = os.stat(path)
+            stamp = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        except OSError:
+            return None
+        e = self.entries.get(path)
+        if e is not None and e[0] == stamp:
+            return e[1]
+        view = dir_view(path, parent, program_names(path))
+        self.entries[path] = (stamp, view)
+        return view
+
+    def trim(self):
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
@@ -0,0 +1,181 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# Short summaries of the programs in the file chooser: line count,
+# extents, tools, cycle time and a thumbnail of the tool path.  They are
+# kept in an sqlite file beside nc_files so they outlive touchy; a row is
+# only trusted while the file still has the size and mtime it was made
+# from.
+#
+# Summaries are made by analysis.analyze() in a worker process, for the
+# files on the visible page only, in the order they are shown.  The stat
+# that checks a stored row is done in the worker as well, as a stat of a
+# file on a dead stick can hang.  Rows on the page are checked again every
+# RECHECK seconds, which catches programs edited in place; neither inotify
+# on the directory nor a stat of it sees those.
+
+import atexit
+import json
+import os
+import sqlite3
+import time
+
+from t_lib import analysis
+
+SCHEMA = """create table if not exists programs (
+    path text primary key, size integer, mtime integer, lines integer,
+    x text, z text, tools text, seconds real, partial integer,
+    thumbnail text)"""
+
+RECHECK = 5.0
+
+class record:
+    def __init__(self, key, lines, x, z, tools, seconds, partial, thumbnail):
+        # (path, size, mtime_ns) of the file this was made from
+        self.key = key
+        self.lines = lines
+        self.x = x
+        self.z = z
+        self.tools = tools
+        self.seconds = seconds
+        self.partial = partial
+        self.thumbnail = thumbnail
+
+    def row(self):
+        return (self.key[0], self.key[1], self.key[2], self.lines,
+                json.dumps(self.x), json.dumps(self.z), json.dumps(self.tools),
+                self.seconds, self.partial, json.dumps(self.thumbnail))
+
+def from_row(row):
+    path, size, mtime, lines, x, z, tools, seconds, partial, thumbnail = row
+    return record((path, size, mtime), lines, json.loads(x), json.loads(z),
+                  json.loads(tools), seconds, partial, json.loads(thumbnail))
+
+def stat_key(fn):
+    st = os.stat(fn)
+    return (fn, st.st_size, st.st_mtime_ns)
+
+# run in the worker: (key, record) for fn, with no record when the one the
+# gui has is still good or the file cannot be read; no key when it is gone
+def describe(fn, known, limits):
+    try:
+        key = stat_key(fn)
+    except OSError:
+        return None, None
+    if key == known:
+        return key, None
+    a = analysis.analyze(fn, limits)
+    if a.error:
+        return key, None
+    return key, record(key, a.lines, a.x, a.z, a.tools, a.seconds, a.partial, a.thumbnail)
+
+def brief(r):
+    t = int(r.seconds + 0.5)
+    t = "%d:%02d:%02d" % (t // 3600, t // 60 % 60, t % 60)
+    if r.partial:
+        t = ">= " + t
+    tools = " ".join(["T%d" % n for n in r.tools])
+    return "  ".join([s for s in ("%d lines" % r.lines, tools, t) if s])
+
+class file_summaries:
+    def __init__(self, fn, limits):
+        self.limits = limits
+        self.records = {}
+        # path -> when its record was last checked against the file
+        self.checked = {}
+        self.futures = {}
+        self.executor = None
+        self.registered = 0
+        # bumped whenever a record changes, so the chooser repopulates
+        self.version = 0
+        try:
+            self.db = sqlite3.connect(fn)
+            self.db.execute(SCHEMA)
+            for row in self.db.execute("select * from programs"):
+                r = from_row(row)
+                self.records[r.key[0]] = r
+        except (sqlite3.Error, ValueError):
+            # summaries are only a convenience; keep them in memory
+            self.db = None
+
+    def get(self, fn):
+        return self.records.get(fn)
+
+    def want(self, paths):
+        # the files on the page now shown; whatever is still queued for
+        # a page that has been left is dropped
+        for p, f in list(self.futures.items()):
+            if p not in paths and f.cancel():
+                del self.futures[p]
+        now = time.time()
+        for p in paths:
+            if now - self.checked.get(p, 0) < RECHECK or p in self.futures:
+                continue
+            r = self.records.get(p)
+            try:
+                self.futures[p] = self.pool().submit(describe, p, r and r.key, self.limits)
+            except analysis.BrokenPool:
+                self.shutdown()
+                self.futures[p] = self.pool().submit(describe, p, r and r.key, self.limits)
+
+    def pool(self):
+        if self.executor is None:
+            if not self.registered:
+                atexit.register(self.shutdown)
+                self.registered = 1
+            self.executor = analysis.worker_pool()
+        return self.executor
+
+    def forget(self):
+        # files may have changed; check them again when they are shown
+        self.checked.clear()
+
+    def poll(self):
+        changed = []
+        removed = []
+        for p, f in list(self.futures.items()):
+            if not f.done():
+                continue
+            del self.futures[p]
+            if f.cancelled():
+                continue
+            try:
+                key, r = f.result()
+            except Exception as detail:
+                if isinstance(detail, analysis.BrokenPool):
+                    self.shutdown()
+                key, r = p, None
+            self.checked[p] = time.time()
+            if key is None:
+                if self.records.pop(p, None) is not None:
+                    removed.append(p)
+            elif r is not None:
+                self.records[p] = r
+                changed.append(r)
+        if not (changed or removed):
+            return 0
+        self.version += 1
+        if self.db is not None:
+            try:
+                self.db.executemany("insert or replace into programs values (?,?,?,?,?,?,?,?,?,?)",
+                                    [r.row() for r in changed])
+                self.db.executemany("delete from programs where path = ?",
+                                    [(p,) for p in removed])
+                self.db.commit()
+            except sqlite3.Error:
+                self.db = None
+        return len(changed) + len(removed)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
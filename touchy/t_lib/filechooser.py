@@ -17,12 +17,20 @@ import os
 import getpass
 from gi.repository import Gdk
 
+from t_lib import file_index
+from t_lib import file_summary
+from t_lib import staging
+
 class filechooser:
-    def __init__(self, gtk, emc, labels, eventboxes, listing, colors):
+    def __init__(self, gtk, emc, labels, eventboxes, listing, analysis, summaries, colors):
         self.labels = labels
         self.eventboxes = eventboxes
         self.numlabels = len(labels)
         self.listing = listing
+        self.analysis = analysis
+        # file_summaries, shown next to the names
+        self.summaries = summaries
+        self.shown = []
         self.gtk = gtk
         self.emc = emc
         self.emccommand = emc.command()
@@ -32,18 +40,48 @@ class filechooser:
         
         self.colors = colors
         
-        self.files = [] 
-        self.reload(0)
+        # kept current from file system events, reload only applies them
+        self.index = file_index.file_index(self.local_dir, os.path.join('/media', getpass.getuser()))
+        self.dirs = file_index.dir_cache(self.index)
+        # directory being browsed, None for the top level; files is what
+        # the labels page through
+        self.cwd = None
+        self.files = self.index
+        self.version = self.index.version
+        self.selected = -1
+        # programs on removable media are copied to local storage before
+        # they are opened when stage_usb is set
+        self.stage_usb = 0
+        self.stager = staging.stager(os.path.join(os.path.dirname(self.local_dir), '.touchy_staging'))
+        self.staging = None
+        self.staging_shown = None
+        self.selected_path = None
+        self.populate()
 
     def populate(self):
-        page_files = self.files[self.fileoffset:]
+        n = len(self.files)
+        shown = []
         
         for i in range(self.numlabels):
             l = self.labels[i]
             e = self.eventboxes[i]
             
-            if i < len(page_files):
-                l.set_text(page_files[i][0])
+            if self.fileoffset + i < n:
+                name, path = self.files[self.fileoffset + i]
+                r = None
+                if path is not None and name != ".." and not name.endswith('/'):
+                    shown.append(path)
+                    r = self.summaries.get(path)
+                j = self.staging
+                if j is not None and j.source == path:
+                    if j.error:
+                        l.set_text("%s   %s" % (name, j.error))
+                    else:
+                        l.set_text("%s   %s" % (name, _("copying %d%%") % j.progress()))
+                elif r is not None:
+                    l.set_text("%s   %s" % (name, file_summary.brief(r)))
+                else:
+                    l.set_text(name)
             else:
                 l.set_text('')
 
@@ -53,6 +91,27 @@ class filechooser:
             else:
                 e.modify_bg(self.gtk.StateFlags.NORMAL, self.colors['normal_bg'])
                 l.modify_fg(self.gtk.StateFlags.NORMAL, self.colors['normal_fg'])
+        self.shown = shown
+        self.summaries.want(shown)
+
+    def browse(self, path):
+        if (path is None or path in self.index.roots() or
+            not self.index.contains(path)):
+            self.cwd = None
+            self.files = self.index
+        else:
+            self.cwd = path
+            parent = os.path.dirname(path)
+            # an empty view until a listing from removable media is in
+            self.files = (self.dirs.get(path, parent) or
+                          file_index.dir_view(path, parent, ()))
+        self.fileoffset = 0
+        self.find_selected()
+
+    def find_selected(self):
+        self.selected = -1
+        if self.selected_path is not None:
+            self.selected = self.files.find(self.selected_path)
 
     def select(self, eventbox, event):
         try:
@@ -69,38 +128,72 @@ class filechooser:
         
         if full_path is None:
             return ""
+
+        if display_name == ".." or display_name.endswith('/'):
+            self.browse(full_path)
+            self.populate()
+            return ""
         
         self.selected = idx
+        self.selected_path = full_path
+        if self.stage_usb and full_path.startswith(self.index.media_root + os.sep):
+            # opened by periodic() once the copy is in; nothing is loaded
+            # yet as far as the caller is concerned
+            self.staging = self.stager.submit(full_path)
+            self.populate()
+            return ""
+        if self.staging is not None:
+            self.staging.cancelled = 1
+            self.staging = None
         self.emccommand.mode(self.emc.MODE_MDI)
         self.emccommand.program_open(full_path)
+        self.stager.use(full_path)
         self.listing.readfile(full_path)
+        self.analysis.submit(full_path)
         self.populate()
         return full_path
 
+    def locate(self, fn):
+        # the file's own directory first, then anything of that name on
+        # the top level; the directory shown already is not listed again.
+        # A staged copy is shown as the file it was copied from
+        fn = self.stager.source(fn) or fn
+        self.selected_path = fn
+        d = os.path.dirname(fn)
+        if d != self.cwd:
+            self.browse(d)
+        else:
+            self.find_selected()
+        if self.selected == -1 and self.cwd is not None:
+            self.browse(None)
+        if self.selected == -1:
+            found = self.files.find_name(os.path.basename(fn))
+            if found:
+                self.selected = found[0]
+                self.selected_path = self.files[self.selected][1]
+        return self.selected != -1
+
     def select_and_show(self, fn):
-        self.reload(0)
-        
-        found_idx = -1
-        for i, (name, path) in enumerate(self.files):
-            if path == fn:
-                found_idx = i
-                break
-        
-        if found_idx == -1:
-            base = os.path.basename(fn)
-            for i, (name, path) in enumerate(self.files):
-                if path and os.path.basename(path) == base:
-                    found_idx = i
-                    break
-
-        if found_idx == -1:
+        # fn is the program LinuxCNC has open now
+        self.stager.use(fn)
+        # the index follows file system events, so it is only brought up
+        # to date for a file it does not know yet, such as one ngcgui has
+        # just written
+        if not self.locate(fn):
+            self.index.update()
+            self.version = self.index.version
+            self.locate(fn)
+
+        if self.selected == -1:
+            self.selected_path = None
+            self.populate()
             return 
 
-        self.selected = found_idx
-        page = found_idx // self.numlabels
+        page = self.selected // self.numlabels
         self.fileoffset = page * self.numlabels
         
         self.listing.readfile(fn)
+        self.analysis.submit(fn)
         self.populate()
 
     def up(self, b):
@@ -117,45 +210,51 @@ class filechooser:
         self.populate()
 
     def reload(self, b):
-        local_files = []
-        usb_files = []
-        valid_exts = ('.ngc', '.nc', '.tap', '.gcode')
-
-        if os.path.exists(self.local_dir):
-            try:
-                for f in os.listdir(self.local_dir):
-                    if f.lower().endswith(valid_exts):
-                        full_path = os.path.join(self.local_dir, f)
-                        if os.path.isfile(full_path):
-                            local_files.append((f, full_path))
-            except OSError:
-                pass
-        
-        local_files.sort(key=lambda x: x[0])
-
-        user = getpass.getuser()
-        media_root = os.path.join('/media', user)
-        if os.path.exists(media_root):
-            try:
-                for mount in os.listdir(media_root):
-                    mount_path = os.path.join(media_root, mount)
-                    if os.path.isdir(mount_path):
-                        for f in os.listdir(mount_path):
-                            if f.lower().endswith(valid_exts):
-                                full_path = os.path.join(mount_path, f)
-                                if os.path.isfile(full_path):
-                                    # No prefix, just the filename
-                                    usb_files.append((f, full_path))
-            except OSError:
-                pass
-
-        usb_files.sort(key=lambda x: x[0])
-
-        self.files = local_files
-        
-        if usb_files:
-            self.files.append(("--- USB ---", None)) 
-            self.files.extend(usb_files)
-        
-        self.selected = -1
-        self.populate()
\ No newline at end of file
+        self.index.update()
+        self.version = self.index.version
+        self.selected_path = None
+        self.summaries.forget()
+        self.browse(self.cwd)
+        self.populate()
+
+    def periodic_staging(self):
+        j = self.staging
+        if j.done and not j.error:
+            self.staging = None
+            if j.local is not None and j.source == self.selected_path:
+                self.emccommand.mode(self.emc.MODE_MDI)
+                self.emccommand.program_open(j.local)
+                self.stager.use(j.local)
+                self.listing.clear_startline()
+            self.populate()
+            return
+        # the progress, or the error, which stays on the file's row until
+        # another file is chosen
+        shown = (j.copied, j.done)
+        if shown != self.staging_shown:
+            self.staging_shown = shown
+            self.populate()
+
+    def periodic(self):
+        if self.staging is not None:
+            self.periodic_staging()
+        # the page's summaries are checked again now and then
+        if self.summaries.poll():
+            self.populate()
+        else:
+            self.summaries.want(self.shown)
+        # show files that appeared or went away without waiting for a reload
+        if self.cwd is None:
+            if not self.index.update() and self.version == self.index.version:
+                return
+            self.version = self.index.version
+            self.summaries.forget()
+        else:
+            view = self.dirs.get(self.cwd, os.path.dirname(self.cwd))
+            if view is None or view is self.files:
+                return
+            self.files = view
+            self.summaries.forget()
+        # the selected file may have moved up or down the list
+        self.find_selected()
+        self.populate()
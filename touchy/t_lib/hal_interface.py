@@ -16,12 +16,15 @@ import hal
 import atexit
 import time
 
+from t_lib import loop_stats
+
 class hal_interface:
-    def __init__(self, gui, emc_control, mdi_control, emc):
+    def __init__(self, gui, emc_control, mdi_control, emc, hub):
         self.gui = gui
         self.emc_control = emc_control
         self.emc = emc
-        self.emc_stat = self.emc.stat()
+        self.hub = hub
+        self.emc_stat = hub.snapshot()
         self.mdi_control = mdi_control
         self.c = hal.component("touchy")
         self.c.newpin("status-indicator", hal.HAL_BIT, hal.HAL_OUT)
@@ -114,6 +117,14 @@ class hal_interface:
         self.c.newpin("css-enabled", hal.HAL_BIT, hal.HAL_OUT)
         self.c.newpin("css-velocity", hal.HAL_FLOAT, hal.HAL_OUT)
 
+        self.c.newpin("stat-polls-per-second", hal.HAL_FLOAT, hal.HAL_OUT)
+
+        for name in loop_stats.TIMERS:
+            for v in ("p50", "p95", "p99", "max"):
+                self.c.newpin("timing.%s.%s-ms" % (name, v), hal.HAL_FLOAT, hal.HAL_OUT)
+            self.c.newpin("timing.%s.overruns" % name, hal.HAL_S32, hal.HAL_OUT)
+        self.c.newpin("timing.tick-overruns", hal.HAL_S32, hal.HAL_OUT)
+
         self.c.ready()
         self.active = 0
         self.jogaxis(0)
@@ -125,7 +136,6 @@ class hal_interface:
         if self.c["lube-distance"] == 0:
             self.c["lube-distance"] = 5000
 
-        self.emc_stat.poll()
         self.traveled_distance = gui.prefs.getpref('travel_dist', 0, float)
         self.prev_joint_pos = list(self.emc_stat.joint_actual_position)
 
@@ -137,6 +147,14 @@ class hal_interface:
         self.counts = counts
         return ret
 
+    def is_busy(self):
+        # wheel turning or any continuous jog input held
+        if self.c["wheel-counts"]/4 != self.counts:
+            return True
+        return bool(self.xp or self.xn or self.yp or self.yn or self.zp or self.zn or
+                    self.ap or self.an or self.bp or self.bn or self.cp or self.cn or
+                    self.up or self.un or self.vp or self.vn or self.wp or self.wn)
+
     def jogaxis(self, n):
         self.c["jog.wheel.x"] = n == 0 and self.active
         self.c["jog.wheel.y"] = n == 1 and self.active
@@ -151,6 +169,17 @@ class hal_interface:
     def jogincrement(self, inc, incs):
         self.c["jog.wheel.increment"] = incs[inc]
 
+    def export_timing(self, summary, tick_overruns):
+        for name in loop_stats.TIMERS:
+            if name not in summary: continue
+            calls, p50, p95, p99, mx, over = summary[name]
+            self.c["timing.%s.p50-ms" % name] = p50
+            self.c["timing.%s.p95-ms" % name] = p95
+            self.c["timing.%s.p99-ms" % name] = p99
+            self.c["timing.%s.max-ms" % name] = mx
+            self.c["timing.%s.overruns" % name] = over
+        self.c["timing.tick-overruns"] = tick_overruns
+
     def resetSpindel(self, val):
         self.c["reset-spindel-index"] = val
 
@@ -296,7 +325,8 @@ class hal_interface:
 
         self.c["manual-feedrate"] = self.manual_feedrate
 
-        self.emc_stat.poll()
+        self.emc_stat = self.hub.snapshot()
+        self.c["stat-polls-per-second"] = self.hub.polls_per_second
         self.c["css-velocity"] = self.gui.css_val
         self.c["css-enabled"] = self.gui.css_active and self.emc_stat.task_mode != self.emc.MODE_AUTO
 
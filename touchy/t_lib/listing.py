@@ -13,8 +13,11 @@
 #we need this _soley_ to define colours.
 from gi.repository import Gdk
 
+import bisect
+
+
 class listing:
-    def __init__(self, gtk, emc, labels, eventboxes, colors):
+    def __init__(self, gtk, emc, labels, eventboxes, colors, cache):
         self.labels = labels
         self.eventboxes = eventboxes
         self.numlabels = len(labels)
@@ -27,31 +30,41 @@ class listing:
         self.program = []
         self.lines = 0
         self.colors = colors
+        # program_cache, hands out programs seen before ready indexed
+        self.cache = cache
+        self.rows = [[None, None] for i in range(self.numlabels)]
         self.populate()
 
     def populate(self):
+        # rows[i] is [text, highlighted] as last painted; only the rows
+        # that differ touch gtk
         program = self.program[int(self.lineoffset):int(self.lineoffset + self.numlabels)]
         for i in range(self.numlabels):
-            l = self.labels[i]
-            e = self.eventboxes[i]
+            n = self.lineoffset + i
             if i < len(program):
-                l.set_text(program[i].rstrip())
+                text = program[i].rstrip()
             else:
-                l.set_text('')
-            
-            if self.start_line == self.lineoffset + i:
-                e.modify_bg(self.gtk.StateFlags.NORMAL, self.colors['selected_bg'])
-                l.modify_fg(self.gtk.StateFlags.NORMAL, self.colors['selected_fg'])
-            elif self.selected == self.lineoffset + i:
-                e.modify_bg(self.gtk.StateFlags.NORMAL, self.colors['selected_bg'])
-                l.modify_fg(self.gtk.StateFlags.NORMAL, self.colors['selected_fg'])
-            else:
-                e.modify_bg(self.gtk.StateFlags.NORMAL, self.colors['normal_bg'])
-                l.modify_fg(self.gtk.StateFlags.NORMAL, self.colors['normal_fg'])
+                text = ''
+            highlight = self.start_line == n or self.selected == n
 
+            row = self.rows[i]
+            if row[0] != text:
+                self.labels[i].set_text(text)
+                row[0] = text
+            if row[1] != highlight:
+                l = self.labels[i]
+                e = self.eventboxes[i]
+                if highlight:
+                    e.modify_bg(self.gtk.StateFlags.NORMAL, self.colors['selected_bg'])
+                    l.modify_fg(self.gtk.StateFlags.NORMAL, self.colors['selected_fg'])
+                else:
+                    e.modify_bg(self.gtk.StateFlags.NORMAL, self.colors['normal_bg'])
+                    l.modify_fg(self.gtk.StateFlags.NORMAL, self.colors['normal_fg'])
+                row[1] = highlight
 
     def show_line(self, n):
-        if len(self.program) <= self.numlabels:
+        self.lines = len(self.program)
+        if self.lines <= self.numlabels:
             self.lineoffset = 0
         else:
             self.lineoffset = min(max(0, n - self.numlabels/2),self.lines - self.numlabels)
@@ -61,7 +74,13 @@ class listing:
         n -= 1                          # program[] is zero-based, emc line numbers are one-based
         if self.selected == n: return
         self.selected = n
-        self.show_line(n)
+        # while running, only scroll once the line leaves the middle half
+        # of the window, so most advances just move the highlight
+        row = n - self.lineoffset
+        if self.numlabels / 4 <= row < self.numlabels * 3 / 4:
+            self.populate()
+        else:
+            self.show_line(n)
 
     def up(self, b):
         self.lineoffset -= self.numlabels
@@ -75,40 +94,92 @@ class listing:
 
     def readfile(self, fn):
         self.filename = fn
-        f = open(fn, 'r')
-        self.program = f.readlines()
-        f.close()
+        # choosing a file loads it here, then again once the status shows
+        # it open; keep the program from the first time, whose index may
+        # still be being built
+        p = self.program
+        try:
+            same = getattr(p, 'key', None) == self.cache.stat_key(fn) and not p.closed
+        except OSError:
+            same = False
+        if not same:
+            if hasattr(p, 'close'):
+                p.close()
+            self.program = self.cache.open(fn)
         self.lines = len(self.program)
         self.lineoffset = 0
         self.selected = -1
         self.populate()
 
+    def periodic(self):
+        # the line index of a big file is still being built: show the
+        # visible lines as soon as they exist
+        if self.lines == len(self.program):
+            return
+        visible = self.lines < self.lineoffset + self.numlabels
+        self.lines = len(self.program)
+        if visible:
+            self.populate()
+
     def reload(self, b):
         pass
 
+    # skipping k blocks is a bisect into the program's sorted index of
+    # N-numbered lines; past the first/last block the start point stops at
+    # the first/last line, as stepping line by line used to
     def previous(self, b,count=1):
-        for i in range(int(count)):
-            while True:
-                if self.start_line <= 0:
-                    break
-                self.start_line -= 1
-                if (self.program[self.start_line][0] == 'N' or
-                    self.program[self.start_line][0] == 'n' ):
-                    break
+        count = int(count)
+        if count > 0 and self.start_line > 0:
+            nlines = self.program.nlines
+            j = bisect.bisect_left(nlines, self.start_line) - count
+            if j >= 0:
+                self.start_line = nlines[j]
+            else:
+                self.start_line = 0
         self.show_line(self.start_line)
 
     def next(self,b,count=1):
         if count < 0: return self.previous(b, int(-count))
-        for i in range(int(count)):
-            while True:
-                if self.start_line >= len(self.program)-1:
-                    break
-                self.start_line += 1
-                if (self.program[self.start_line][0] == 'N' or
-                    self.program[self.start_line][0] == 'n' ):
-                    break
+        count = int(count)
+        last = len(self.program) - 1
+        if count > 0 and self.start_line < last:
+            nlines = self.program.nlines
+            j = bisect.bisect_right(nlines, self.start_line) + count - 1
+            if j < len(nlines):
+                self.start_line = min(nlines[j], last)
+            else:
+                self.start_line = last
         self.show_line(self.start_line)
         
+    # tool changes and features are jumped between the same way; there is
+    # nothing to stop at past the first/last one, so the start point stays
+    def seek(self, index, count):
+        # index names the program's sorted list of lines to jump between
+        lines = getattr(self.program, index, None)
+        if lines is None:
+            # no program loaded yet
+            return
+        if count < 0:
+            j = bisect.bisect_left(lines, self.start_line) + count
+        else:
+            j = bisect.bisect_right(lines, self.start_line) + count - 1
+        if 0 <= j < len(lines):
+            self.start_line = lines[j]
+        if self.start_line >= 0:
+            self.show_line(self.start_line)
+
+    def previous_tool(self, b):
+        self.seek('tools', -1)
+
+    def next_tool(self, b):
+        self.seek('tools', 1)
+
+    def previous_feature(self, b):
+        self.seek('features', -1)
+
+    def next_feature(self, b):
+        self.seek('features', 1)
+
     def on_select(self, b, c):
         pass
 
@@ -0,0 +1,89 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# Run time of the periodic gui callbacks: a rolling window of samples for
+# p50/p95/p99/max, plus a counter of calls that took longer than their
+# period.  Percentiles are computed by summarize(), not per call.
+
+import collections
+import time
+
+# timers touchy creates; hal_interface exports a pin set for each
+TIMERS = ('poll', 'hal', 'wheel', 'status', 'emc_status', 'radiobuttons')
+
+class loop_timer:
+    def __init__(self, name, window=500):
+        self.name = name
+        self.samples = collections.deque(maxlen=window)
+        self.calls = 0
+        self.overruns = 0
+        self.max = 0.0
+        # period in ms the call has to fit in, updated by the caller
+        self.period = 0
+
+    def record(self, ms):
+        self.samples.append(ms)
+        self.calls += 1
+        if ms > self.max:
+            self.max = ms
+        if self.period and ms > self.period:
+            self.overruns += 1
+
+    def wrap(self, fn):
+        def timed(*args):
+            start = time.time()
+            try:
+                return fn(*args)
+            finally:
+                self.record((time.time() - start) * 1000.0)
+        return timed
+
+    def summarize(self):
+        s = sorted(self.samples)
+        if not s:
+            return (self.calls, 0.0, 0.0, 0.0, self.max, self.overruns)
+        n = len(s) - 1
+        return (self.calls, s[n // 2], s[n * 95 // 100], s[n * 99 // 100],
+                self.max, self.overruns)
+
+class loop_stats:
+    def __init__(self):
+        self.timers = collections.OrderedDict()
+
+    def timer(self, name):
+        if name not in self.timers:
+            self.timers[name] = loop_timer(name)
+        return self.timers[name]
+
+    def summarize(self):
+        return collections.OrderedDict(
+            (name, t.summarize()) for name, t in self.timers.items())
+
+    def format(self, summary):
+        lines = ["%-13s %7s %7s %7s %7s %7s %5s" %
+                 ("task", "calls", "p50", "p95", "p99", "max", "over")]
+        for name, (calls, p50, p95, p99, mx, over) in summary.items():
+            lines.append("%-13s %7d %7.2f %7.2f %7.2f %7.2f %5d" %
+                         (name, calls, p50, p95, p99, mx, over))
+        return "\n".join(lines)
+
+    def write(self, fn, summary):
+        # one line per timer and call, appended so stalls can be lined up
+        # with other logs afterwards
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            f = open(fn, "a")
+            for name, values in summary.items():
+                f.write("%s %s %d %.3f %.3f %.3f %.3f %d\n" % ((stamp, name) + values))
+            f.close()
+        except IOError as detail:
+            print("loop_stats:", detail)
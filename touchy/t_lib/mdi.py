@@ -28,14 +28,13 @@
 from gi.repository import Gdk
 
 class mdi:
-    def __init__(self, emc):
+    def __init__(self, emc, hub):
         self.clear()
         self.emc = emc
-        self.emcstat = emc.stat()
+        self.hub = hub
         self.emccommand = emc.command()
 
-        self.emcstat.poll()
-        am = self.emcstat.axis_mask
+        am = self.hub.snapshot().axis_mask
 
         self.axes = []
         self.polar = 0
@@ -148,15 +147,14 @@ class mdi:
                 if len(self.words.get(i)) > 0:
                     m += i + self.words.get(i)
 
-        self.emcstat.poll()
-        if self.emcstat.task_mode != self.emc.MODE_MDI:
+        if self.hub.fresh().task_mode != self.emc.MODE_MDI:
             self.emccommand.mode(self.emc.MODE_MDI)
             self.emccommand.wait_complete()
         self.emccommand.mdi(m)
 
 
 class mdi_control:
-    def __init__(self, gtk, emc, labels, eventboxes, colors):
+    def __init__(self, gtk, emc, hub, labels, eventboxes, colors):
         self.labels = labels
         self.eventboxes = eventboxes
         self.colors = colors
@@ -165,7 +163,7 @@ class mdi_control:
         self.selected = 0
         self.gtk = gtk
         
-        self.mdi = mdi(emc)
+        self.mdi = mdi(emc, hub)
         
         for i in range(self.numlabels):
             self.not_editing(i)
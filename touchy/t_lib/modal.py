@@ -0,0 +1,200 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# The modal state a program builds up, as far as it matters for starting
+# in the middle of it: units, plane, diameter mode, distance mode, work
+# offset, feed and spindle modes, tool, tool length offset, spindle and
+# coolant.
+#
+# The program analysis records a checkpoint of the state every CHECKPOINT
+# lines; the state at any line is then the nearest checkpoint plus at most
+# CHECKPOINT lines read back from the program.
+
+import re
+
+CHECKPOINT = 1000
+
+WORD = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+COMMENT = re.compile(r'\([^)]*\)')
+EXPRESSION = re.compile(r'\[[^\]]*\]|#<[^>]*>|#\d+')
+
+# (gcodes, mcodes, words, exact) of one line, None if it has no words.
+# Subroutine lines and the parts of a line computed from parameters are
+# left out; exact is false when that happened.
+def parse(line):
+    line = line.strip().upper()
+    if not line or line.startswith('/'):
+        return None
+    line = COMMENT.sub('', line).split(';', 1)[0].strip()
+    if not line:
+        return None
+    if line.startswith('O'):
+        return [], [], {}, False
+    exact = True
+    if '#' in line or '[' in line:
+        line = EXPRESSION.sub('', line)
+        exact = False
+    gcodes = []
+    mcodes = []
+    words = {}
+    for letter, value in WORD.findall(line):
+        if letter == 'G':
+            gcodes.append(float(value))
+        elif letter == 'M':
+            mcodes.append(float(value))
+        else:
+            words[letter] = float(value)
+    if not (gcodes or mcodes or words) and exact:
+        return None
+    return gcodes, mcodes, words, exact
+
+class modal_state:
+    FIELDS = ('units', 'plane', 'diameter', 'distance', 'wcs', 'feed_mode',
+              'spindle_mode', 'clamp', 'speed', 'feed', 'tool', 'loaded',
+              'tlo', 'tlo_h', 'spindle', 'mist', 'flood')
+
+    def __init__(self, mm, startup=""):
+        self.units = 21 if mm else 20
+        self.plane = 18
+        self.diameter = 8
+        self.distance = 90
+        self.wcs = 54
+        self.feed_mode = 94
+        self.spindle_mode = 97
+        self.clamp = 0
+        self.speed = 0.0
+        self.feed = 0.0
+        # prepared and loaded tool, None until the program says
+        self.tool = None
+        self.loaded = None
+        self.tlo = 49
+        self.tlo_h = None
+        self.spindle = 5
+        self.mist = 0
+        self.flood = 0
+        p = parse(startup)
+        if p:
+            self.update(*p[:3])
+
+    def update(self, gcodes, mcodes, words):
+        if 'T' in words:
+            self.tool = int(words['T'])
+        if 'F' in words:
+            self.feed = words['F']
+        if 'S' in words:
+            self.speed = words['S']
+        for g in gcodes:
+            if g in (7, 8):
+                self.diameter = int(g)
+            elif g in (17, 18, 19):
+                self.plane = int(g)
+            elif g in (20, 21):
+                self.units = int(g)
+            elif g in (90, 91):
+                self.distance = int(g)
+            elif g in (93, 94, 95):
+                self.feed_mode = int(g)
+            elif g == 96:
+                self.spindle_mode = 96
+                if 'D' in words:
+                    self.clamp = words['D']
+            elif g == 97:
+                self.spindle_mode = 97
+            elif 54 <= g <= 59.3:
+                self.wcs = g
+            elif g in (43, 43.1):
+                self.tlo = 43
+                self.tlo_h = int(words['H']) if 'H' in words else None
+            elif g == 49:
+                self.tlo = 49
+                self.tlo_h = None
+        for m in mcodes:
+            if m in (3, 4, 5):
+                self.spindle = int(m)
+            elif m == 6:
+                self.loaded = self.tool
+            elif m == 7:
+                self.mist = 1
+            elif m == 8:
+                self.flood = 1
+            elif m == 9:
+                self.mist = self.flood = 0
+
+    def checkpoint(self):
+        return tuple([getattr(self, f) for f in self.FIELDS])
+
+    def restore(self, checkpoint):
+        for f, v in zip(self.FIELDS, checkpoint):
+            setattr(self, f, v)
+
+# the state in effect when line n (zero based) starts, or None while the
+# checkpoints do not reach that far yet
+def state_at(program, checkpoints, n):
+    k = n // CHECKPOINT
+    if k >= len(checkpoints):
+        return None
+    s = modal_state(0)
+    s.restore(checkpoints[k])
+    for line in program[k * CHECKPOINT:n]:
+        p = parse(line)
+        if p:
+            s.update(*p[:3])
+    return s
+
+def gcode(g):
+    if g == int(g):
+        return "G%d" % g
+    return "G%.1f" % g
+
+def spindle_words(s):
+    if s.spindle_mode == 96:
+        w = "G96 S%g" % s.speed
+        if s.clamp:
+            w += " D%g" % s.clamp
+        return w
+    return "G97 S%g" % s.speed
+
+def describe(s):
+    codes = [gcode(s.units), gcode(s.diameter), gcode(s.distance), gcode(s.wcs),
+             gcode(s.feed_mode), spindle_words(s), "F%g" % s.feed]
+    if s.loaded is not None:
+        codes.append("T%d" % s.loaded)
+    if s.tlo == 43:
+        codes.append(s.tlo_h is None and "G43" or "G43 H%d" % s.tlo_h)
+    codes.append("M%d" % s.spindle)
+    if s.mist: codes.append("M7")
+    if s.flood: codes.append("M8")
+    return " ".join(codes)
+
+# mdi lines that bring the machine into state s before resuming; the tool
+# is only changed if another one is in the spindle
+def preamble(s, tool_in_spindle):
+    lines = [" ".join([gcode(s.units), gcode(s.plane), gcode(s.diameter), gcode(s.distance),
+                       gcode(s.wcs), gcode(s.feed_mode), "F%g" % s.feed])]
+    if s.loaded is not None and s.loaded != tool_in_spindle:
+        lines.append("T%d M6" % s.loaded)
+    if s.tlo == 43:
+        lines.append(s.tlo_h is None and "G43" or "G43 H%d" % s.tlo_h)
+    else:
+        lines.append("G49")
+    lines.append("%s M%d" % (spindle_words(s), s.spindle))
+    if s.mist or s.flood:
+        lines.append(" ".join((s.mist and ["M7"] or []) + (s.flood and ["M8"] or [])))
+    else:
+        lines.append("M9")
+    return lines
+
+# what the interpreter has to report once the preamble ran, as in
+# linuxcnc.stat().gcodes
+def expected_gcodes(s):
+    return [int(round(g * 10)) for g in (s.units, s.diameter, s.distance, s.wcs,
+                                          s.feed_mode, s.spindle_mode)]
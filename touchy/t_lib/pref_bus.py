@@ -0,0 +1,179 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# Hands touchy's theme and font preferences to the programs embedded in
+# its tabs, so they follow changes without reading ~/.touchy_preferences.
+#
+# touchy listens on a unix socket whose path it puts in the environment of
+# the tab programs it starts.  A subscriber gets every published
+# preference when it connects and every change after that, as lines of
+# json [option, value].  A subscriber that does not keep up is dropped.
+
+import json
+import os
+import socket
+import tempfile
+import threading
+
+ENV = "TOUCHY_PREF_BUS"
+
+# what the tabs can make use of
+KEYS = ('gtk_theme', 'control_font', 'dro_font', 'error_font', 'listing_font')
+
+def message(option, value):
+    return (json.dumps([option, value]) + "\n").encode()
+
+class publisher:
+    def __init__(self, prefs, keys=KEYS, path=None):
+        if path is None:
+            d = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+            path = os.path.join(d, "touchy-prefs-%d" % os.getpid())
+        self.path = path
+        self.prefs = prefs
+        self.keys = keys
+        self.lock = threading.Lock()
+        self.clients = []
+        if os.path.exists(path):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(4)
+        prefs.listeners.append(self.publish)
+        os.environ[ENV] = path
+        t = threading.Thread(target=self.accept, daemon=True)
+        t.start()
+
+    def accept(self):
+        while True:
+            try:
+                c, addr = self.sock.accept()
+            except OSError:
+                return
+            c.setblocking(False)
+            with self.lock:
+                ok = 1
+                for k in self.keys:
+                    if ok and self.prefs.has_option("DEFAULT", k):
+                        ok = self.send(c, message(k, str(self.prefs.get("DEFAULT", k))))
+                if ok:
+                    self.clients.append(c)
+
+    def send(self, c, m):
+        # a short write leaves the subscriber half a line; it is dropped
+        # like one whose buffer is full
+        try:
+            if c.send(m) == len(m):
+                return 1
+        except OSError:
+            pass
+        c.close()
+        return 0
+
+    def publish(self, option, value):
+        if option not in self.keys:
+            return
+        m = message(option, value)
+        with self.lock:
+            self.clients = [c for c in self.clients if self.send(c, m)]
+
+    def close(self):
+        self.prefs.listeners.remove(self.publish)
+        self.sock.close()
+        with self.lock:
+            for c in self.clients:
+                c.close()
+            self.clients = []
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+# For a tab program: connects to the bus touchy started it with, OSError if
+# there is none.  Wait for fileno() to be readable, then read().
+class subscriber:
+    def __init__(self, path=None):
+        path = path or os.environ.get(ENV)
+        if not path:
+            raise OSError("no touchy preference bus")
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()
+            raise
+        self.sock.setblocking(False)
+        self.buf = b""
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read(self):
+        # the (option, value) changes that came in, None once touchy is gone
+        try:
+            b = self.sock.recv(65536)
+        except BlockingIOError:
+            return []
+        except OSError:
+            b = b""
+        if not b:
+            self.sock.close()
+            return None
+        lines = (self.buf + b).split(b"\n")
+        self.buf = lines.pop()
+        changes = []
+        for l in lines:
+            try:
+                option, value = json.loads(l)
+            except ValueError:
+                continue
+            changes.append((option, value))
+        return changes
+
+# For a gtk tab program: applies touchy's theme, and its control font as
+# the program's default font, as they come in.  Run outside touchy, the
+# theme is read from the preferences file once instead.
+class gtk_follower:
+    def __init__(self, gtk, glib):
+        self.gtk = gtk
+        try:
+            self.bus = subscriber()
+        except OSError:
+            self.bus = None
+            from t_lib import preferences
+            prefs = preferences.preferences()
+            self.apply('gtk_theme', prefs.getpref('gtk_theme', 'Follow System Theme', str))
+            return
+        glib.io_add_watch(self.bus.fileno(), glib.PRIORITY_DEFAULT,
+                          glib.IO_IN | glib.IO_HUP | glib.IO_ERR, self.on_prefs)
+
+    def on_prefs(self, fd, condition):
+        changes = self.bus.read()
+        if changes is None:
+            self.bus = None
+            return False
+        for option, value in changes:
+            self.apply(option, value)
+        return True
+
+    def apply(self, option, value):
+        if option == 'gtk_theme':
+            if value == "Follow System Theme":
+                return
+            prop = "gtk-theme-name"
+        elif option == 'control_font':
+            prop = "gtk-font-name"
+        else:
+            return
+        try:
+            self.gtk.Settings.get_default().set_property(prop, value)
+        except Exception as e:
+            print(">>> ERROR setting %s: %s" % (prop, e))
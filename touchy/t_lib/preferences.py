@@ -12,12 +12,23 @@
 
 
 
+# Preferences live in ~/.touchy_preferences.  Changes are kept in memory
+# and written behind, WRITE_DELAY seconds after the first one, so a burst
+# of them costs one write; the file is replaced atomically by a synced
+# temporary file, and whatever is still pending is written at exit.
+# Listeners are called with (option, value) for every change.
+
+import atexit
+import io
 import os
 import sys
+import threading
 
 import configparser
 cp = configparser.RawConfigParser
 
+WRITE_DELAY = 2.0
+
 class preferences(cp):
     types = {
         bool: cp.getboolean,
@@ -31,6 +42,14 @@ class preferences(cp):
         cp.__init__(self)
         self.fn = os.path.expanduser("~/.touchy_preferences")
         self.read(self.fn)
+        # lock guards the values, write_lock the file
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.dirty = 0
+        self.timer = None
+        self.writes = 0
+        self.listeners = []
+        atexit.register(self.flush)
 
     def getpref(self, option, default=False, type=bool):
         m = self.types.get(type)
@@ -38,11 +57,49 @@ class preferences(cp):
             o = m(self, "DEFAULT", option)
         except Exception as detail:
             print(detail)
-            self.set("DEFAULT", option, default)
-            self.write(open(self.fn, "w"))
+            self.store(option, default)
             o = default
         return o
 
     def putpref(self, option, value, type=bool):
-        self.set("DEFAULT", option, type(value))
-        self.write(open(self.fn, "w"))
+        self.store(option, type(value))
+
+    def store(self, option, value):
+        with self.lock:
+            if self.has_option("DEFAULT", option) and str(self.get("DEFAULT", option)) == str(value):
+                return
+            self.set("DEFAULT", option, value)
+            self.dirty = 1
+            if self.timer is None:
+                self.timer = threading.Timer(WRITE_DELAY, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        for l in self.listeners:
+            l(option, str(value))
+
+    def flush(self):
+        # one write at a time; a flush at exit waits for one the timer has
+        # in progress, and then writes whatever came in meanwhile
+        with self.write_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return
+                text = io.StringIO()
+                self.write(text)
+                self.dirty = 0
+            tmp = self.fn + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    f.write(text.getvalue())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.fn)
+                self.writes += 1
+            except OSError as detail:
+                print(detail)
+                # try again at the next change, or at exit
+                with self.lock:
+                    self.dirty = 1
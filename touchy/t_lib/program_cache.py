@@ -0,0 +1,143 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# Line indexes and analyses of recently loaded programs, so switching
+# between a few jobs neither re-reads nor re-analyses them.
+#
+# Entries are keyed by (path, size, mtime).  The index thread of a new
+# program hashes its content as it goes; once that is in, an entry with the
+# same content under another key lends its analysis.  That catches the
+# 0.ngc/1.ngc files ngcgui alternates between without reading a file on
+# the gui thread.
+# The least recently used entries go once their indexes and analyses
+# exceed the budget, or there are more than ENTRIES of them.
+
+import collections
+import copy
+import os
+
+from t_lib import program_file
+
+ENTRIES = 32
+
+# rough cost of an analysis: its fixed fields, a tuple per checkpoint and
+# a pair of floats per thumbnail point
+def analysis_bytes(a):
+    if a is None:
+        return 0
+    return 1024 + 512 * len(a.checkpoints) + 64 * len(a.thumbnail)
+
+class entry:
+    def __init__(self, key):
+        self.key = key
+        # the program while its index is still being built
+        self.program = None
+        self.index = None
+        self.analysis = None
+        self.bytes = 0
+
+    def settle(self):
+        # take over the index once the program has finished it; a program
+        # closed half way is of no use
+        p = self.program
+        if p is None:
+            return
+        if p.complete:
+            self.index = p.index()
+            self.bytes = p.index_bytes()
+            self.program = None
+        elif p.closed:
+            self.program = None
+
+class program_cache:
+    def __init__(self, budget=64 << 20):
+        self.budget = budget
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def stat_key(self, fn):
+        st = os.stat(fn)
+        return (fn, st.st_size, st.st_mtime_ns)
+
+    def find(self, key):
+        e = self.entries.get(key)
+        if e is not None:
+            self.entries.move_to_end(key)
+        return e
+
+    def twin_analysis(self, key):
+        # the analysis of the same content under another key, None until
+        # the entry's index thread has the digest or if there is none
+        e = self.entries.get(key)
+        if e is None:
+            return None
+        e.settle()
+        if e.index is None:
+            return None
+        d = e.index[4]
+        for c in self.entries.values():
+            c.settle()
+            if c is not e and c.analysis is not None and c.index is not None and c.index[4] == d:
+                e.analysis = copy.copy(c.analysis)
+                e.analysis.fn = key[0]
+                return e.analysis
+        return None
+
+    def add(self, e):
+        self.entries[e.key] = e
+        self.entries.move_to_end(e.key)
+        self.trim()
+
+    def size(self, e):
+        e.settle()
+        return e.bytes + analysis_bytes(e.analysis)
+
+    def trim(self):
+        total = sum(self.size(e) for e in self.entries.values())
+        while (total > self.budget or len(self.entries) > ENTRIES) and len(self.entries) > 1:
+            key, e = self.entries.popitem(last=False)
+            total -= self.size(e)
+
+    def open(self, fn):
+        # a program_file for fn, from the cached index when there is one
+        key = self.stat_key(fn)
+        e = self.find(key)
+        if e is not None:
+            e.settle()
+            if e.index is not None:
+                self.hits += 1
+                return program_file.program_file(fn, e.index)
+        self.misses += 1
+        p = program_file.program_file(fn)
+        if e is None:
+            e = entry(p.key)
+            self.add(e)
+        e.program = p
+        return p
+
+    def analysis(self, fn):
+        try:
+            e = self.find(self.stat_key(fn))
+        except OSError:
+            return None, None
+        if e is None:
+            return None, None
+        return e.key, e.analysis
+
+    def put_analysis(self, key, result):
+        e = self.entries.get(key)
+        if e is None:
+            e = entry(key)
+            self.add(e)
+        e.analysis = result
+        self.trim()
@@ -0,0 +1,230 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# A g-code program as a read-only sequence of lines, read with pread from
+# a descriptor kept open.  A file that is truncated or rewritten in place,
+# or is on a stick that gets pulled, then gives short or failed reads; a
+# mapping would take the whole gui down with SIGBUS.
+#
+# The line offset index is built by a background thread a chunk at a
+# time; until it is complete len() is the number of lines indexed so far.
+# Only the lines actually asked for are decoded.
+#
+# The same pass records which lines start with an N word, sorted, so run
+# from line navigation can skip k blocks with a bisect.  Tool changes and
+# features (o<name> call, #<_feature:> markers, G76 threading) are indexed
+# the same way from a regex scan of each chunk's complete lines, which
+# passes over ( ) and ; comments as the analysis does.
+#
+# The finished index and a digest of the content can be handed to a new
+# program_file for the same content, which then opens the file and is done.
+
+import array
+import bisect
+import hashlib
+import itertools
+import operator
+import os
+import re
+import threading
+
+CHUNK = 1 << 20
+
+# one pass finds both kinds; the alternatives are picked by the letter
+# already matched, which keeps the scan close to a plain byte search.
+# A comment is matched whole, so nothing in it is taken for a mark
+MARK = re.compile(br'\([^)\n]*\)?|;[^\n]*|'
+                  br'[TtMmGgOo#](?:(?<=[Tt])\s*\d|(?<=[Mm])\s*0*6(?![\d.])|'
+                  br'(?<=[Gg])\s*0*76(?![\d.])|(?<=[Oo])\s*<[^>\n]*>\s*CALL|'
+                  br'(?<=#)<_feature:)', re.I)
+TOOL_LETTERS = b'TtMm'
+# a T, M or G that is part of a name like o<part1> or #<_tool> is no word
+NAME_CHARS = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_#<')
+
+def digest(fn):
+    h = hashlib.blake2b(digest_size=16)
+    f = open(fn, 'rb')
+    try:
+        while True:
+            b = f.read(CHUNK)
+            if not b:
+                break
+            h.update(b)
+    finally:
+        f.close()
+    return h.digest()
+
+class program_file:
+    def __init__(self, fn, index=None):
+        self.fn = fn
+        # closed by close(), or by the index thread if that is later
+        self.file = open(fn, 'rb')
+        st = os.fstat(self.file.fileno())
+        self.size = st.st_size
+        # identifies this version of the file without reading it
+        self.key = (fn, st.st_size, st.st_mtime_ns)
+
+        # offsets[i] is where line i starts, offsets[i+1] where it ends
+        self.offsets = array.array('Q', [0])
+        # indices of lines starting with N or n
+        self.nlines = array.array('Q')
+        # indices of lines with a tool change or a feature, sorted
+        self.tools = array.array('Q')
+        self.features = array.array('Q')
+        self.digest = None
+        self.complete = False
+        self.closed = False
+        self.indexing = False
+        self.lock = threading.Lock()
+        self.thread = None
+        if index is not None:
+            self.offsets, self.nlines, self.tools, self.features, self.digest = index
+            self.complete = True
+            return
+        self.indexing = True
+        self.thread = threading.Thread(target=self.index_thread, name="touchy-index")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def read(self, start, end):
+        # what is there now; a file that shrank reads short
+        try:
+            return os.pread(self.file.fileno(), end - start, start)
+        except (OSError, ValueError):
+            # ValueError once closed
+            return b''
+
+    def index_thread(self):
+        try:
+            self.build_index()
+        finally:
+            with self.lock:
+                self.indexing = False
+                if self.closed:
+                    self.file.close()
+
+    def build_index(self):
+        offsets = self.offsets
+        is_block = operator.methodcaller('startswith', (b'N', b'n'))
+        continued = False
+        scanned = 0
+        # the lines not scanned yet, from offsets[scanned] on
+        pending = b''
+        h = hashlib.blake2b(digest_size=16)
+        for start in range(0, self.size, CHUNK):
+            if self.closed:
+                return
+            chunk = self.read(start, min(start + CHUNK, self.size))
+            if not chunk:
+                # the file shrank under us; index what there was
+                break
+            h.update(chunk)
+            parts = chunk.split(b'\n')
+            # parts[j] belongs to line base + j; parts[0] is only a line
+            # start if the previous chunk ended on a newline
+            base = len(offsets) - 1
+            first = 1 if continued else 0
+            starts = map(is_block, itertools.islice(parts, first, None))
+            self.nlines.extend(itertools.compress(itertools.count(base + first), starts))
+            continued = parts[-1] != b''
+            # end of every complete line in the chunk, all in C
+            ends = itertools.accumulate(map(operator.add, map(len, parts[:-1]),
+                                            itertools.repeat(1)))
+            offsets.extend(map(operator.add, ends, itertools.repeat(start)))
+            pending += chunk
+            pending = self.scan(pending, scanned, len(offsets) - 1)
+            scanned = len(offsets) - 1
+        end = offsets[-1] + len(pending)
+        if pending:
+            # last line without a newline
+            offsets.append(end)
+            self.scan(pending, scanned, len(offsets) - 1)
+        self.size = end
+        self.digest = h.digest()
+        self.complete = True
+
+    def scan(self, data, first, last):
+        # lines first..last-1 are complete, data holds them from offsets
+        # [first] on; returns what is left after them.  Marks are rare,
+        # so mapping each one back to its line with a bisect is cheap
+        o = self.offsets
+        base = o[first]
+        for m in MARK.finditer(data, 0, o[last] - base):
+            p = m.start()
+            c = data[p]
+            if c in b'(;':
+                continue
+            if c in b'Oo#':
+                lines = self.features
+            else:
+                # data starts at a line start, so p == 0 follows a newline
+                if p and data[p - 1] in NAME_CHARS:
+                    continue
+                lines = self.tools if c in TOOL_LETTERS else self.features
+            i = bisect.bisect_right(o, base + p, first, last) - 1
+            if not lines or lines[-1] != i:
+                lines.append(i)
+        return data[o[last] - base:]
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    def index(self):
+        # everything a program_file for the same content can start from
+        if not self.complete:
+            return None
+        return (self.offsets, self.nlines, self.tools, self.features, self.digest)
+
+    def index_bytes(self):
+        return sum(a.itemsize * len(a) for a in (self.offsets, self.nlines,
+                                                  self.tools, self.features))
+
+    def close(self):
+        # an index thread still running stops at its next chunk and closes
+        # the file on its way out
+        with self.lock:
+            self.closed = True
+            if not self.indexing:
+                self.file.close()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def line(self, i):
+        o = self.offsets
+        return self.read(o[i], o[i + 1]).decode('utf-8', 'replace')
+
+    def lines(self, first, last):
+        # one read for a run of lines
+        o = self.offsets
+        data = self.read(o[first], o[last])
+        base = o[first]
+        return [data[o[j] - base:o[j + 1] - base].decode('utf-8', 'replace')
+                for j in range(first, last)]
+
+    def __getitem__(self, i):
+        n = len(self)
+        if isinstance(i, slice):
+            first, last, step = i.indices(n)
+            if step == 1:
+                return self.lines(first, max(first, last))
+            return [self.line(j) for j in range(first, last, step)]
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError("program line out of range")
+        return self.line(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.line(i)
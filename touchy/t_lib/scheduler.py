@@ -0,0 +1,138 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# Runs the periodic gui tasks from a single self re-arming GLib timeout.
+# Every task has a period per machine state, so the gui ticks fast while
+# something moves and backs off when the machine is idle or in E-stop.
+
+import math
+import time
+import traceback
+
+# machine states, as returned by the activity callback
+ACTIVE = 0
+IDLE = 1
+ESTOP = 2
+
+# task priorities; when a tick overruns its budget the highest numbers are
+# shed first, SAFETY tasks are never skipped
+SAFETY = 0
+NORMAL = 1
+COSMETIC = 2
+
+# clean ticks needed before a shed priority level is brought back
+RECOVER_TICKS = 20
+
+class task:
+    def __init__(self, name, callback, periods, priority):
+        self.name = name
+        self.callback = callback
+        self.periods = periods
+        self.priority = priority
+        self.due = 0
+        self.runs = 0
+        self.skipped = 0
+        # callbacks that raised; the task keeps running regardless
+        self.errors = 0
+        self.timer = None
+
+class scheduler:
+    def __init__(self, glib, activity, stats=None):
+        self.glib = glib
+        self.activity = activity
+        # optional loop_stats, every task is timed against its period
+        self.stats = stats
+        self.tasks = []
+        self.state = ACTIVE
+        # tasks with priority >= shed are skipped
+        self.shed = COSMETIC + 1
+        self.clean_ticks = 0
+        self.overruns = 0
+        self.running = 0
+
+    def add(self, name, callback, active_ms, idle_ms, estop_ms=None, priority=NORMAL):
+        if estop_ms is None:
+            estop_ms = idle_ms
+        t = task(name, callback, (active_ms, idle_ms, estop_ms), priority)
+        if self.stats is not None:
+            t.timer = self.stats.timer(name)
+        self.tasks.append(t)
+        return t
+
+    def start(self):
+        self.running = 1
+        self.glib.timeout_add(1, self.tick)
+
+    def stop(self):
+        self.running = 0
+
+    def budget(self):
+        return min(t.periods[self.state] for t in self.tasks) / 1000.0
+
+    def run(self, t):
+        try:
+            t.callback()
+        except Exception:
+            t.errors += 1
+            print("task %s failed:" % t.name)
+            traceback.print_exc()
+
+    def tick(self):
+        if not self.running:
+            return False
+
+        start = time.time()
+        try:
+            self.run_due(start)
+        finally:
+            # re-arm for the next task that falls due; tasks whose period
+            # shrank because the machine woke up are pulled in as well
+            now = time.time()
+            for t in self.tasks:
+                t.due = min(t.due, start + t.periods[self.state] / 1000.0)
+            delay = min(t.due for t in self.tasks) - now
+            self.glib.timeout_add(max(1, int(math.ceil(delay * 1000))), self.tick)
+        return False
+
+    def run_due(self, start):
+        self.state = self.activity()
+        ran = 0
+        for t in self.tasks:
+            if start < t.due:
+                continue
+            t.due = start + t.periods[self.state] / 1000.0
+            if t.priority >= self.shed:
+                t.skipped += 1
+                continue
+            t.runs += 1
+            ran = 1
+            if t.timer is None:
+                self.run(t)
+                continue
+            t.timer.period = t.periods[self.state]
+            t0 = time.time()
+            self.run(t)
+            t.timer.record((time.time() - t0) * 1000.0)
+
+        # only ticks that did some work count towards shedding or recovery
+        if not ran:
+            return
+        if time.time() - start > self.budget():
+            self.overruns += 1
+            self.clean_ticks = 0
+            if self.shed > NORMAL:
+                self.shed -= 1
+        else:
+            self.clean_ticks += 1
+            if self.clean_ticks >= RECOVER_TICKS and self.shed <= COSMETIC:
+                self.shed += 1
+                self.clean_ticks = 0
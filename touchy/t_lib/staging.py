@@ -0,0 +1,149 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# Copies programs from removable media to a local cache before they are
+# opened.  The interpreter reads a program as it runs, so a stick that
+# stalls or is pulled would otherwise stop the job half way through.
+#
+# The copy is hashed as it is read from the stick, then read back from the
+# cache and hashed again; only a copy whose hashes agree is used.  Copies
+# live in <cache>/<key>/<name>, where key is made from the source's path,
+# size and mtime, so choosing the same file again finds the copy there.
+# The least recently used copies go once the cache outgrows its budget,
+# except the one LinuxCNC has open, which it reads again on a rerun.
+
+import hashlib
+import os
+import shutil
+import threading
+
+from t_lib import program_file
+
+class job:
+    def __init__(self, source):
+        self.source = source
+        self.size = 0
+        self.copied = 0
+        # the local copy once it is verified, or the reason there is none
+        self.local = None
+        self.error = None
+        self.done = 0
+        self.cancelled = 0
+
+    def progress(self):
+        if self.size == 0:
+            return 0
+        return 100 * self.copied // self.size
+
+class stager:
+    def __init__(self, cache_dir, budget=256 << 20):
+        self.cache_dir = cache_dir
+        self.budget = budget
+        self.job = None
+        # local copy -> source, so the chooser can show where a program
+        # that is open from the cache came from
+        self.sources = {}
+        # the program LinuxCNC has open, which may be a copy here
+        self.in_use = None
+        self.hits = 0
+        self.misses = 0
+
+    def submit(self, source):
+        if self.job is not None:
+            self.job.cancelled = 1
+        j = self.job = job(source)
+        t = threading.Thread(target=self.run, args=(j,), daemon=True)
+        t.start()
+        return j
+
+    def source(self, local):
+        return self.sources.get(local)
+
+    def use(self, fn):
+        self.in_use = fn
+
+    def run(self, j):
+        try:
+            self.stage(j)
+        except OSError as detail:
+            j.error = str(detail)
+        j.done = 1
+
+    def stage(self, j):
+        st = os.stat(j.source)
+        j.size = st.st_size
+        key = hashlib.blake2b(("%s\0%d\0%d" % (j.source, st.st_size, st.st_mtime_ns)).encode(),
+                              digest_size=8).hexdigest()
+        d = os.path.join(self.cache_dir, key)
+        local = os.path.join(d, os.path.basename(j.source))
+        if os.path.exists(local):
+            # touched, so the copy counts as recently used
+            os.utime(d)
+            self.hits += 1
+            j.copied = j.size
+            self.finish(j, local)
+            return
+
+        self.misses += 1
+        os.makedirs(d, exist_ok=True)
+        tmp = local + ".part"
+        h = hashlib.blake2b(digest_size=16)
+        with open(j.source, 'rb') as src, open(tmp, 'wb') as dst:
+            while True:
+                if j.cancelled:
+                    break
+                b = src.read(program_file.CHUNK)
+                if not b:
+                    break
+                h.update(b)
+                dst.write(b)
+                j.copied += len(b)
+            dst.flush()
+            os.fsync(dst.fileno())
+        if j.cancelled:
+            os.unlink(tmp)
+            return
+        if program_file.digest(tmp) != h.digest():
+            os.unlink(tmp)
+            j.error = "copy does not match %s" % os.path.basename(j.source)
+            return
+        os.replace(tmp, local)
+        self.finish(j, local)
+        self.trim()
+
+    def finish(self, j, local):
+        self.sources[local] = j.source
+        j.local = local
+
+    def trim(self):
+        copies = []
+        total = 0
+        for key in os.listdir(self.cache_dir):
+            d = os.path.join(self.cache_dir, key)
+            size = 0
+            for name in os.listdir(d):
+                size += os.stat(os.path.join(d, name)).st_size
+            copies.append((os.stat(d).st_mtime, d, size))
+            total += size
+        copies.sort()
+        # the newest copy stays even when it is over the budget on its own
+        keep = self.in_use and os.path.dirname(self.in_use)
+        for mtime, d, size in copies[:-1]:
+            if total <= self.budget:
+                break
+            if d == keep:
+                continue
+            shutil.rmtree(d, ignore_errors=True)
+            total -= size
+            for local in list(self.sources):
+                if os.path.dirname(local) == d:
+                    del self.sources[local]
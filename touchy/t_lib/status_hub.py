@@ -0,0 +1,204 @@
+# Touchy is Copyright (c) 2009  Chris Radek <chris@timeguy.com>
+#
+# Touchy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# Touchy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# One linuxcnc.stat() for the whole gui.  The hub polls once per tick and
+# every consumer reads the same frozen snapshot of that poll.
+#
+# Once start() is called the polling moves to a background thread.  It
+# publishes each new snapshot into a single slot where the latest value
+# wins, so a slow gtk tick never delays the status data and the gtk side
+# never waits on NML.
+
+import collections
+import threading
+import time
+
+# every stat field touchy reads; the getters of linuxcnc.stat build new
+# tuples on each access, so they are copied exactly once per poll
+FIELDS = (
+    'actual_position', 'axis_mask', 'block_delete', 'current_line',
+    'current_vel', 'delay_left', 'distance_to_go', 'dtg', 'exec_state',
+    'feedrate', 'file', 'flood', 'g5x_index', 'g5x_offset', 'g92_offset',
+    'gcodes', 'homed', 'interp_state', 'joint', 'joint_actual_position',
+    'kinematics_type', 'limit', 'max_velocity', 'mcodes', 'mist',
+    'motion_id', 'motion_line', 'motion_mode', 'optional_stop', 'paused',
+    'pocket_prepped', 'position', 'queue', 'rotation_xy', 'settings',
+    'spindle', 'state', 'task_mode', 'task_state', 'tool_in_spindle',
+    'tool_offset', 'tool_table',
+)
+
+MAX_ERRORS_PER_POLL = 64
+
+class snapshot(object):
+    def __init__(self, stat, serial, stamp, **extra):
+        d = self.__dict__
+        for f in FIELDS:
+            d[f] = getattr(stat, f)
+        d['serial'] = serial
+        d['stamp'] = stamp
+        d.update(extra)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("status snapshot is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("status snapshot is read-only")
+
+class status_hub:
+    def __init__(self, emc):
+        self.emc = emc
+        self.stat = emc.stat()
+        self.error_channel = emc.error_channel()
+        self.serial = 0
+        self.current = None
+
+        # written by the poller thread, read by gtk
+        self.latest = None
+        # (time, kind, text); bounded in case the gui stops draining
+        self.errors = collections.deque(maxlen=256)
+        self.thread = None
+        self.running = 0
+        self.period = 0.05
+
+        # bumped whenever the tool table content changes or is reloaded,
+        # so the gui compares one int instead of the whole table
+        self.tool_table_version = 0
+        self.tool_table_hash = None
+        self.tool_table_reload = 0
+
+        # polls per second, refreshed once a second
+        self.polls_per_second = 0.0
+        self.window_start = time.time()
+        self.window_polls = 0
+
+    def read(self, stat, error_channel):
+        stat.poll()
+        now = time.time()
+        self.serial += 1
+        tool_table = stat.tool_table
+        h = hash(tool_table)
+        if h != self.tool_table_hash or self.tool_table_reload:
+            self.tool_table_hash = h
+            self.tool_table_reload = 0
+            self.tool_table_version += 1
+        snap = snapshot(stat, self.serial, now,
+                        tool_table_version=self.tool_table_version)
+
+        # drain the whole error queue, a burst must not trickle out one
+        # message per poll
+        for i in range(MAX_ERRORS_PER_POLL):
+            e = error_channel.poll()
+            if not e:
+                break
+            self.errors.append((now, e[0], e[1]))
+
+        self.window_polls += 1
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            self.polls_per_second = self.window_polls / elapsed
+            self.window_polls = 0
+            self.window_start = now
+        return snap
+
+    def poll(self):
+        # synchronous poll on the calling thread
+        self.current = self.read(self.stat, self.error_channel)
+        return self.current
+
+    def fresh(self):
+        # a poll of its own for code that is about to pick a command; a
+        # snapshot can be a poll period old.  Leaves the error channel to
+        # the poller and the published snapshot alone
+        self.stat.poll()
+        return snapshot(self.stat, self.serial, time.time(),
+                        tool_table_version=self.tool_table_version)
+
+    def update(self):
+        # once per gui tick: take whatever the poller published last
+        if self.thread is None:
+            return self.poll()
+        snap = self.latest
+        if snap is not None:
+            self.current = snap
+        return self.current
+
+    def snapshot(self):
+        if self.current is None:
+            return self.poll()
+        return self.current
+
+    def reload_tool_table(self):
+        self.tool_table_reload = 1
+
+    def get_error(self):
+        try:
+            return self.errors.popleft()
+        except IndexError:
+            return None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = 1
+        self.thread = threading.Thread(target=self.run, name="touchy-status")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = 0
+
+    def run(self):
+        # the poller keeps its own stat buffer; the error channel has a
+        # single reader, which from here on is this thread
+        stat = self.emc.stat()
+        while self.running:
+            start = time.time()
+            try:
+                self.latest = self.read(stat, self.error_channel)
+            except self.emc.error as detail:
+                print("status poller:", detail)
+            delay = self.period - (time.time() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+_unset = object()
+
+# Calls an updater only when one of its inputs differs from the previous
+# snapshot.  An input is either a stat field name or a callable taking the
+# snapshot, for values that live outside linuxcnc.stat (hal pins, prefs).
+# Updaters at or above the shed priority are held back; their inputs are
+# not recorded, so they catch up once the gui has time again.
+class dispatcher:
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback, *inputs, priority=1):
+        getters = []
+        for i in inputs:
+            if callable(i):
+                getters.append(i)
+            else:
+                getters.append(lambda s, f=i: getattr(s, f))
+        self.subscribers.append([callback, getters, _unset, priority])
+
+    def invalidate(self):
+        for sub in self.subscribers:
+            sub[2] = _unset
+
+    def dispatch(self, snap, shed=3):
+        for sub in self.subscribers:
+            if sub[3] >= shed:
+                continue
+            key = tuple([g(snap) for g in sub[1]])
+            if key != sub[2]:
+                sub[2] = key
+                sub[0](snap)
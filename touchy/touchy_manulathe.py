@@ -82,6 +82,13 @@ from t_lib import hal_interface
 from t_lib import filechooser
 from t_lib import listing
 from t_lib import preferences
+from t_lib import pref_bus
+from t_lib import status_hub
+from t_lib import scheduler
+from t_lib import loop_stats
+from t_lib import analysis
+from t_lib import file_summary
+from t_lib import program_cache
 from QuitDialog import QuitDialog
 
 pix_data = '''/* XPM */
@@ -215,13 +222,17 @@ class touchy:
         if not self.theme_name == "Follow System Theme":
             settings.set_string_property("gtk-theme-name", self.theme_name, "")
 
+        # one status poll per tick, shared by everything below
+        self.status_hub = status_hub.status_hub(linuxcnc)
+        self.status_hub.poll()
+
         # interactive mdi command builder and issuer
         mdi_labels = []
         mdi_eventboxes = []
         for i in range(self.num_mdi_labels):
             mdi_labels.append(self.get_widget("mdi%d" % i))
             mdi_eventboxes.append(self.get_widget("eventbox_mdi%d" % i))
-        self.mdi_control = mdi.mdi_control(Gtk, linuxcnc, mdi_labels, mdi_eventboxes, self.colors)
+        self.mdi_control = mdi.mdi_control(Gtk, linuxcnc, self.status_hub, mdi_labels, mdi_eventboxes, self.colors)
         if self.ini:
             macros = self.ini.findall("TOUCHY", "MACRO")
             if len(macros) > 0:
@@ -234,12 +245,21 @@ class touchy:
         for i in range(self.num_listing_labels):
             listing_labels.append(self.get_widget("listing%d" % i))
             listing_eventboxes.append(self.get_widget("eventbox_listing%d" % i))
-        self.listing = listing.listing(Gtk, linuxcnc, listing_labels, listing_eventboxes, self.colors)
+        # indexes and analyses of the last few programs loaded
+        self.program_cache = program_cache.program_cache()
+        self.listing = listing.listing(Gtk, linuxcnc, listing_labels, listing_eventboxes, self.colors,
+                                       self.program_cache)
+
+        # extents, tools, cycle time and modal checkpoints of the loaded
+        # program, worked out in a separate process
+        self.analysis = analysis.program_analysis(analysis.machine_limits(self.ini),
+                                                  self.program_cache)
 
         # emc interface
-        self.linuxcnc = emc_interface.emc_control(linuxcnc, self.listing, self.get_widget("error"))
+        self.linuxcnc = emc_interface.emc_control(linuxcnc, self.status_hub, self.listing, self.analysis, self.get_widget("error"))
+        self.linuxcnc.resume_preamble = self.prefs.getpref('resume_preamble', 0)
         self.linuxcnc.continuous_jog_velocity(self.mv_val)
-        self.hal = hal_interface.hal_interface(self, self.linuxcnc, self.mdi_control, linuxcnc)
+        self.hal = hal_interface.hal_interface(self, self.linuxcnc, self.mdi_control, linuxcnc, self.status_hub)
         self.hal.manual_feedrate = self.manual_feedrate_val
 
         # silly file chooser
@@ -248,7 +268,14 @@ class touchy:
         for i in range(self.num_filechooser_labels):
             filechooser_labels.append(self.get_widget("filechooser%d" % i))
             filechooser_eventboxes.append(self.get_widget("eventbox_filechooser%d" % i))
-        self.filechooser = filechooser.filechooser(Gtk, linuxcnc, filechooser_labels, filechooser_eventboxes, self.listing, self.colors)
+        # line count, tools and cycle time next to each program's name
+        self.file_summaries = file_summary.file_summaries(
+            os.path.join(os.getenv('HOME'), 'linuxcnc', '.touchy_programs.db'),
+            self.analysis.limits)
+        self.filechooser = filechooser.filechooser(Gtk, linuxcnc, filechooser_labels, filechooser_eventboxes,
+                                                   self.listing, self.analysis, self.file_summaries,
+                                                   self.colors)
+        self.filechooser.stage_usb = self.prefs.getpref('stage_usb', 0)
 
         relative = ['xr', 'yr', 'zr', 'ar', 'br', 'cr', 'ur', 'vr', 'wr']
         absolute = ['xa', 'ya', 'za', 'aa', 'ba', 'ca', 'ua', 'va', 'wa']
@@ -270,7 +297,8 @@ class touchy:
         stats = ['file', 'file_lines', 'line', 'id', 'dtg', 'velocity', 'delay', 'onlimit',
                  'spindledir', 'spindlespeed', 'loadedtool', 'preppedtool',
                  'xyrotation', 'tlo', 'activecodes', 'spindlespeed2',
-                 'label_g5xoffset', 'g5xoffset', 'g92offset', 'tooltable']
+                 'label_g5xoffset', 'g5xoffset', 'g92offset', 'tooltable',
+                 'extents', 'travel', 'tools', 'spindlemodes', 'cycletime', 'startstate']
         stats = dict((i, self.get_widget("status_" + i)) for i in stats)
         prefs = ['actual', 'commanded', 'inch', 'mm']
         prefs = dict((i, self.get_widget("dro_" + i)) for i in prefs)
@@ -281,7 +309,7 @@ class touchy:
         spindle_values = ['sp_commanded', 'sp_current', 'sp_angle']
         spindle_values = dict((i, self.get_widget(i)) for i in spindle_values)
 
-        self.status = emc_interface.emc_status(Gtk, linuxcnc, self.listing, self.hal, relative, absolute, distance,
+        self.status = emc_interface.emc_status(Gtk, linuxcnc, self.status_hub, self.listing, self.analysis, self.hal, relative, absolute, distance,
                                                self.get_widget("dro_table"),
                                                self.get_widget("error"),
                                                estops, machines,
@@ -306,6 +334,13 @@ class touchy:
 
         self.status.set_machine_units(self.machine_units_mm, conversion)
 
+        self.loop_stats = loop_stats.loop_stats()
+        self.emc_status_timer = self.loop_stats.timer('emc_status')
+        self.status.periodic = self.emc_status_timer.wrap(self.status.periodic)
+        self.timing_log = self.ini.find("TOUCHY", "TIMING_LOG")
+        if self.timing_log:
+            self.timing_log = os.path.expanduser(self.timing_log)
+
         if self.prefs.getpref('toolsetting_fixture', 0):
             self.g10l11 = 1
         else:
@@ -335,8 +370,20 @@ class touchy:
 
         self.linuxcnc.max_velocity(self.mv_val)
                                 
-        GLib.timeout_add(50, self.periodic_status)
-        GLib.timeout_add(100, self.periodic_radiobuttons)
+        # periods in ms while moving / idle / in E-stop
+        self.scheduler = scheduler.scheduler(GLib, self.machine_activity, self.loop_stats)
+        self.poll_task = self.scheduler.add('poll', self.periodic_poll, 50, 100, 250, priority=scheduler.SAFETY)
+        # edge detection of the cycle start, abort, single block and quill
+        # up inputs; a short pulse must not fall between two runs
+        self.scheduler.add('hal', self.periodic_hal, 50, 50, 50, priority=scheduler.SAFETY)
+        self.scheduler.add('wheel', self.periodic_wheel, 50, 100, 250, priority=scheduler.SAFETY)
+        self.status_task = self.scheduler.add('status', self.periodic_status, 50, 250, 500, priority=scheduler.SAFETY)
+        self.scheduler.add('radiobuttons', self.periodic_radiobuttons, 100, 250, 500)
+        self.scheduler.add('lube', self.update_lube_label, 250, 1000, priority=scheduler.COSMETIC)
+        self.scheduler.add('files', self.filechooser.periodic, 500, 1000, priority=scheduler.COSMETIC)
+        self.scheduler.start()
+        self.status_hub.start()
+        atexit.register(self.status_hub.stop)
 
         self.fullscreen = self.prefs.getpref('fullscreen', 1)
         self.fullscreen_startup_processed = 0
@@ -349,10 +396,10 @@ class touchy:
             "on_pointer_hide_clicked" : self.pointer_hide,
             "on_fullscreen_on_clicked" : self.fullscreen_on,
             "on_fullscreen_off_clicked" : self.fullscreen_off,
-            "on_opstop_on_clicked" : self.opstop_on,
-            "on_opstop_off_clicked" : self.opstop_off,
-            "on_blockdel_on_clicked" : self.blockdel_on,
-            "on_blockdel_off_clicked" : self.blockdel_off,
+            "on_opstop_on_clicked" : self.resynced(self.opstop_on),
+            "on_opstop_off_clicked" : self.resynced(self.opstop_off),
+            "on_blockdel_on_clicked" : self.resynced(self.blockdel_on),
+            "on_blockdel_off_clicked" : self.resynced(self.blockdel_off),
             "on_reload_tooltable_clicked" : self.linuxcnc.reload_tooltable,
             "on_notebook1_switch_page" : self.tabselect,
             "on_controlfontbutton_font_set" : self.change_control_font,
@@ -363,10 +410,10 @@ class touchy:
             "on_dro_mm_clicked" : self.dro_mm,
             "on_errorfontbutton_font_set" : self.change_error_font,
             "on_listingfontbutton_font_set" : self.change_listing_font,
-            "on_estop_clicked" : self.linuxcnc.estop,
-            "on_estop_reset_clicked" : self.linuxcnc.estop_reset,
-            "on_machine_off_clicked" : self.linuxcnc.machine_off,
-            "on_machine_on_clicked" : self.linuxcnc.machine_on,
+            "on_estop_clicked" : self.resynced(self.linuxcnc.estop),
+            "on_estop_reset_clicked" : self.resynced(self.linuxcnc.estop_reset),
+            "on_machine_off_clicked" : self.resynced(self.linuxcnc.machine_off),
+            "on_machine_on_clicked" : self.resynced(self.linuxcnc.machine_on),
             "on_mdi_clear_clicked" : self.mdi_control.clear,
             "on_mdi_back_clicked" : self.mdi_control.back,
             "on_mdi_next_clicked" : self.mdi_control.next,
@@ -389,11 +436,15 @@ class touchy:
             "on_listing_down_clicked" : self.listing.down,
             "on_listing_previous_clicked" : self.listing.previous,
             "on_listing_next_clicked" : self.listing.next,
+            "on_listing_previous_tool_clicked" : self.listing.previous_tool,
+            "on_listing_next_tool_clicked" : self.listing.next_tool,
+            "on_listing_previous_feature_clicked" : self.listing.previous_feature,
+            "on_listing_next_feature_clicked" : self.listing.next_feature,
             "on_listing_select" : self.listing.on_select,
-            "on_mist_on_clicked" : self.linuxcnc.mist_on,
-            "on_mist_off_clicked" : self.linuxcnc.mist_off,
-            "on_flood_on_clicked" : self.linuxcnc.flood_on,
-            "on_flood_off_clicked" : self.linuxcnc.flood_off,
+            "on_mist_on_clicked" : self.resynced(self.linuxcnc.mist_on),
+            "on_mist_off_clicked" : self.resynced(self.linuxcnc.mist_off),
+            "on_flood_on_clicked" : self.resynced(self.linuxcnc.flood_on),
+            "on_flood_off_clicked" : self.resynced(self.linuxcnc.flood_off),
             "on_home_all_clicked" : self.linuxcnc.home_all,
             "on_unhome_all_clicked" : self.linuxcnc.unhome_all,
             "on_home_x_clicked" : self.home_x_axis,
@@ -408,12 +459,12 @@ class touchy:
             "on_manual_feed_clicked" : self.manual_feed,
             "on_manual_clicked" : self.set_manual,
             "on_scrolling_clicked" : self.scrolling,
-            "on_override_limits_clicked" : self.linuxcnc.override_limits,
+            "on_override_limits_clicked" : self.resynced(self.linuxcnc.override_limits),
             "on_reset_spinde_index_clicked" : self.reset_spindle_index,
             "on_trigger_lube_cycle_clicked" : self.trigger_lube_cycle,
-            "on_spindle_forward_clicked" : self.spindle_forward,
-            "on_spindle_off_clicked" : self.linuxcnc.spindle_off,
-            "on_spindle_reverse_clicked" : self.spindle_reverse,
+            "on_spindle_forward_clicked" : self.resynced(self.spindle_forward),
+            "on_spindle_off_clicked" : self.resynced(self.linuxcnc.spindle_off),
+            "on_spindle_reverse_clicked" : self.resynced(self.spindle_reverse),
             "on_spindle_slower_clicked" : self.spindle_slower,
             "on_spindle_faster_clicked" : self.spindle_faster,
             "on_toolset_fixture_clicked" : self.toolset_fixture,
@@ -427,6 +478,23 @@ class touchy:
             if isinstance(widget, Gtk.Button):
                 widget.connect_after('released',self.hack_leave)
 
+        self.build_error_tab()
+        self.scheduler.add('errors', self.periodic_error_history, 250, 1000, priority=scheduler.COSMETIC)
+        self.build_diagnostics_tab()
+        # the timing pins and log have to keep up through the stalls they
+        # are there to catch, so they are not shed with the tab
+        self.scheduler.add('timing', self.periodic_timing, 1000, 1000)
+        self.scheduler.add('diagnostics', self.periodic_diagnostics, 1000, 1000, priority=scheduler.COSMETIC)
+
+        # theme and fonts for the embedded tabs, which find the socket in
+        # their environment
+        try:
+            self.pref_bus = pref_bus.publisher(self.prefs)
+            atexit.register(self.pref_bus.close)
+        except OSError as detail:
+            print("preference bus:", detail)
+            self.pref_bus = None
+
         self._dynamic_childs = {}
         atexit.register(self.kill_dynamic_childs)
         self.set_dynamic_tabs()
@@ -459,6 +527,14 @@ class touchy:
             self.widgets[widget_name] = self.wTree.get_object(widget_name)
         return self.widgets[widget_name]
 
+    def resynced(self, handler):
+        # radio buttons for machine state show what was clicked until their
+        # updater runs again; have it run on the next status tick
+        def f(*args):
+            handler(*args)
+            self.status.resync_now()
+        return f
+
     def tabselect(self, notebook, b, tab):
         self.tab = tab
 
@@ -669,7 +745,8 @@ class touchy:
                   "dro_commanded", "dro_actual", "dro_inch", "dro_mm",
                   "reload_tooltable", "opstop_on", "opstop_off", "blockdel_on", "blockdel_off",
                   "pointer_hide", "pointer_show", "fullscreen_on", "fullscreen_off",
-                  "toolset_workpiece", "toolset_fixture", "change_theme", "reset_spinde_index", "trigger_lube_cycle", "shut_down"]:
+                  "toolset_workpiece", "toolset_fixture", "change_theme", "reset_spinde_index", "trigger_lube_cycle", "shut_down",
+                  "error_history_clear"]:
             w = self.get_widget(i)
             if w:
                 w.override_font(self.control_font)
@@ -689,6 +766,7 @@ class touchy:
         for i in range(self.num_listing_labels):
             w = self.get_widget("listing%d" % i)
             w.override_font(self.listing_font)
+        self.get_widget("status_startstate").override_font(self.listing_font)
         for i in ["mdi", "startup", "manual", "auto", "preferences", "status",
                   "relative", "absolute", "dtg", "ss2label", "status_spindlespeed2",
                   "spindle_stat"]:
@@ -716,8 +794,11 @@ class touchy:
             if not self.err_textcolor == "default":
                 w.modify_fg(Gtk.StateFlags.NORMAL,Gdk.color_parse(self.dtg_textcolor))
 
+        w = self.get_widget("diagnostics")
+        w.override_font(Pango.FontDescription("Monospace 10"))
+
         # status bar
-        for i in ["error"]:
+        for i in ["error", "error_history"]:
             w = self.get_widget(i)
             w.override_font(self.error_font)
             if not self.err_textcolor == "default":
@@ -740,22 +821,45 @@ class touchy:
 
     def fileselect(self, eb, e):
         self.wheel = "scrolling"
-        self.current_file = self.filechooser.select(eb, e)
-        self.listing.clear_startline()
+        fn = self.filechooser.select(eb, e)
+        # browsing into a directory does not load anything
+        if fn:
+            self.current_file = fn
+            self.listing.clear_startline()
+
+    def machine_activity(self):
+        s = self.status_hub.snapshot()
+        if self.hal.is_busy() or any(self.linuxcnc.isjogging):
+            return scheduler.ACTIVE
+        if s.task_state == linuxcnc.STATE_ESTOP:
+            return scheduler.ESTOP
+        if s.current_vel > 0 or s.queue > 0 or s.interp_state != linuxcnc.INTERP_IDLE:
+            return scheduler.ACTIVE
+        return scheduler.IDLE
+
+    def periodic_poll(self):
+        # the poller thread follows the gui rate
+        self.status_hub.period = self.poll_task.periods[self.scheduler.state] / 1000.0
+        self.status_hub.update()
 
     def periodic_status(self):
         self.linuxcnc.mask()
         self.radiobutton_mask = 1
-        self.status.periodic()
+        self.emc_status_timer.period = self.status_task.periods[self.scheduler.state]
+        self.analysis.poll()
+        self.linuxcnc.poll_resume()
+        self.status.periodic(self.scheduler.shed)
         # check if current_file changed
         # perhaps by another gui or a gladevcp app
         if self.current_file != self.status.emcstat.file:
             self.current_file = self.status.emcstat.file
             self.filechooser.select_and_show(self.current_file)
+        self.listing.periodic()
         self.radiobutton_mask = 0
         self.linuxcnc.unmask()
+
+    def periodic_hal(self):
         self.hal.periodic(self.tab == 1)  # MDI tab?
-        return True
 
     def wheelFoUpdate(self, d):
         if self.hal.wheelreset:
@@ -837,10 +941,8 @@ class touchy:
             if d != 0:
                 self.hal.manual_feedrate = self.manual_feedrate_val
 
-    def periodic_radiobuttons(self):
-        self.radiobutton_mask = 1
-        s = linuxcnc.stat()
-        s.poll()
+    def periodic_wheel(self):
+        s = self.status_hub.snapshot()
         # Show effect of external override inputs
         self.fo_val = s.feedrate * 100
         self.so_val = s.spindle[0]['override'] * 100
@@ -848,6 +950,37 @@ class touchy:
 
         self.hal.resetSpindel(0)
 
+        d = self.hal.wheel()
+        if self.wheel == "fo":
+            self.wheelFoUpdate(d)
+        if self.wheel == "so":
+            self.wheelSoUpdate(d)
+        if self.wheel == "rpm":
+            self.wheelRPMUpdate(d)
+        if self.wheel == "css":
+            self.wheelCSSUpdate(d)
+        if self.wheel == "mv":
+            self.wheelMvUpdate(d)
+        if self.wheel == "manual_feed":
+            self.wheelManualFeedUpdate(d)
+
+        if self.wheel == "scrolling":
+            d0 = d * 10 ** (2 - self.wheelinc)
+            if d != 0:
+                self.listing.next(None, d0)
+
+        if (self.hal.spindle_forward == 1):
+            self.spindle_forward(0)
+        
+        if (self.hal.spindle_reverse == 1):
+            self.spindle_reverse(0)
+
+        if (self.hal.spindle_stop == 1):
+            self.linuxcnc.spindle_off(0)
+
+    def periodic_radiobuttons(self):
+        self.radiobutton_mask = 1
+
         if self.tab != 3 and self.wheel == "scrolling":
             self.wheel = "fo"
 
@@ -886,49 +1019,17 @@ class touchy:
         set_active(self.get_widget("toolset_fixture"), self.g10l11)
         self.radiobutton_mask = 0
 
-        d = self.hal.wheel()
-        if self.wheel == "fo":
-            self.wheelFoUpdate(d)
-        if self.wheel == "so":
-            self.wheelSoUpdate(d)
-        if self.wheel == "rpm":
-            self.wheelRPMUpdate(d)
-        if self.wheel == "css":
-            self.wheelCSSUpdate(d)
-        if self.wheel == "mv":
-            self.wheelMvUpdate(d)
-        if self.wheel == "manual_feed":
-            self.wheelManualFeedUpdate(d)
-
-        if self.wheel == "scrolling":
-            d0 = d * 10 ** (2 - self.wheelinc)
-            if d != 0:
-                self.listing.next(None, d0)
-
-        self.get_widget("fo").set_label("FO: %d%%" % self.fo_val)
-        self.get_widget("so").set_label("SO: %d%%" % self.so_val)
+        set_label(self.get_widget("fo"), "FO: %d%%" % self.fo_val)
+        set_label(self.get_widget("so"), "SO: %d%%" % self.so_val)
 
         if (self.status.is_manual_mode == 1):
-            self.get_widget("rpm").set_label("RPM: %d" % self.spindle_speed_val)
-            self.get_widget("css").set_label("CSS: %d" % self.css_val)
+            set_label(self.get_widget("rpm"), "RPM: %d" % self.spindle_speed_val)
+            set_label(self.get_widget("css"), "CSS: %d" % self.css_val)
         css_color = self.colors['active_btn_fg'] if self.css_active else self.colors['selected_fg']
         self.get_widget("css").modify_fg(Gtk.StateFlags.NORMAL, css_color)
 
-        self.get_widget("mv").set_label("MV: %.2f" % self.mv_val)
-        self.get_widget("manual_feed").set_label("Feed: %.3f" % self.manual_feedrate_val)
-
-        if (self.hal.spindle_forward == 1):
-            self.spindle_forward(0)
-        
-        if (self.hal.spindle_reverse == 1):
-            self.spindle_reverse(0)
-
-        if (self.hal.spindle_stop == 1):
-            self.linuxcnc.spindle_off(0)
-
-        self.update_lube_label()
-
-        return True
+        set_label(self.get_widget("mv"), "MV: %.2f" % self.mv_val)
+        set_label(self.get_widget("manual_feed"), "Feed: %.3f" % self.manual_feedrate_val)
         
     def fullscreen_startup(self):
         if(self.fullscreen_startup_processed == 1): return
@@ -944,6 +1045,83 @@ class touchy:
         _, x, y = Gdk.Window.get_origin(w)
         d.warp_pointer(s, x, y)
 
+    def build_error_tab(self):
+        view = Gtk.TextView()
+        view.set_editable(False)
+        view.set_cursor_visible(False)
+        view.set_wrap_mode(Gtk.WrapMode.WORD_CHAR)
+        sw = Gtk.ScrolledWindow()
+        sw.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        sw.add(view)
+        clear = Gtk.Button(label=_("Clear"))
+        clear.connect('clicked', self.clear_error_history)
+        box = Gtk.VBox()
+        box.pack_start(sw, True, True, 0)
+        box.pack_start(clear, False, False, 0)
+        nb = self.get_widget('notebook1')
+        nb.append_page(box, Gtk.Label(" " + _("Errors") + " "))
+        nb.show_all()
+        self.widgets['error_history'] = view
+        self.widgets['error_history_clear'] = clear
+        self.error_history_version = -1
+
+    def clear_error_history(self, b):
+        self.status.errors.clear()
+        set_text(self.get_widget("error"), "")
+
+    def periodic_error_history(self):
+        log = self.status.errors
+        if log.version == self.error_history_version: return
+        self.error_history_version = log.version
+        lines = []
+        # newest first, so the last message is visible without scrolling
+        for e in reversed(log.entries):
+            if e.kind in (linuxcnc.NML_ERROR, linuxcnc.OPERATOR_ERROR):
+                kind = _("Error")
+            else:
+                kind = _("Message")
+            line = "%s  %s: %s" % (time.strftime("%H:%M:%S", time.localtime(e.last)), kind, e.text)
+            if e.count > 1:
+                line += " (x%d)" % e.count
+            lines.append(line)
+        self.get_widget("error_history").get_buffer().set_text("\n".join(lines))
+
+    def build_diagnostics_tab(self):
+        label = Gtk.Label()
+        label.set_alignment(0.0, 0.0)
+        label.set_selectable(False)
+        sw = Gtk.ScrolledWindow()
+        sw.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+        sw.add_with_viewport(label)
+        nb = self.get_widget('notebook1')
+        nb.append_page(sw, Gtk.Label(" " + _("Diagnostics") + " "))
+        nb.show_all()
+        self.widgets['diagnostics'] = label
+
+    def periodic_timing(self):
+        summary = self.loop_stats.summarize()
+        self.hal.export_timing(summary, self.scheduler.overruns)
+        if self.timing_log:
+            self.loop_stats.write(self.timing_log, summary)
+
+    def periodic_diagnostics(self):
+        summary = self.loop_stats.summarize()
+        states = (_("moving"), _("idle"), _("E-stop"))
+        lines = [self.loop_stats.format(summary), "",
+                 "%s: %s   %s: %d   %s: %d" % (_("state"), states[self.scheduler.state],
+                                                  _("tick overruns"), self.scheduler.overruns,
+                                                  _("shed level"), self.scheduler.shed),
+                 "%s: %.1f" % (_("stat polls/s"), self.status_hub.polls_per_second)]
+        for name, m in (("tool table", self.status.tooltable_memo),
+                        ("active codes", self.status.codes_memo),
+                        ("offsets", self.status.offsets_memo)):
+            lines.append("%s cache: %d hits, %d misses" % (name, m.hits, m.misses))
+        c = self.program_cache
+        lines.append("program cache: %d hits, %d misses, %d entries" % (c.hits, c.misses, len(c.entries)))
+        st = self.filechooser.stager
+        lines.append("usb staging: %d hits, %d misses" % (st.hits, st.misses))
+        set_text(self.get_widget("diagnostics"), "\n".join(lines))
+
     def _dynamic_tab(self, notebook, text):
         s = Gtk.Socket()
         notebook.append_page(s, Gtk.Label(" " + text + " "))